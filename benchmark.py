@@ -29,6 +29,10 @@ TOPO = "dumbbell"
 TUNE = True
 RESTORE = False
 RESTORE_PATH = file_dir + "./"
+# Time the per-port and the batched qdisc setup of the topology before
+# testing and report it in the output and test_config.json. Builds the
+# topology twice more, set to False to skip it.
+COMPARE_QDISC = True
 
 
 def check_dir(directory):
@@ -48,7 +52,23 @@ def generate_testname(output_dir):
     return testname
 
 
-def dump_config(path, pattern):
+def compare_qdisc_setup():
+    # Imported here, building a topology requires Mininet and root
+    from dc_gym.factories import TopoFactory
+    qdisc_times = {}
+    for tc_batch in (False, True):
+        topo = TopoFactory.create(TOPO, {"tc_batch": tc_batch})
+        topo.start_network()
+        qdisc_times["batch" if tc_batch else "per_port"] = \
+            topo.startup_times["qdiscs"]
+        topo.stop_network()
+    print("Qdisc setup of %s: per port %.3fs, batched %.3fs (%.1fx)" % (
+        TOPO, qdisc_times["per_port"], qdisc_times["batch"],
+        qdisc_times["per_port"] / max(qdisc_times["batch"], 1e-6)))
+    return qdisc_times
+
+
+def dump_config(path, pattern, qdisc_times=None):
     test_config = {}
     test_config["transport"] = TRANSPORT
     test_config["timesteps"] = STEPS
@@ -57,6 +77,8 @@ def dump_config(path, pattern):
     test_config["tcp_algorithms"] = TCP_ALGOS
     test_config["rl_algorithms"] = RL_ALGOS
     test_config["pattern"] = pattern
+    if qdisc_times is not None:
+        test_config["qdisc_setup"] = qdisc_times
     # Get a string formatted time stamp
     ts = time.time()
     st = datetime.datetime.fromtimestamp(ts).strftime('%Y_%m_%d_%H_%M_%S')
@@ -82,13 +104,16 @@ def launch_test(algo, results_subdir, transport, pattern):
 
 
 def run_tests():
+    qdisc_times = None
+    if COMPARE_QDISC:
+        qdisc_times = compare_qdisc_setup()
     for pattern in TF_PATTERNS:
         testname = generate_testname(OUTPUT_DIR)
         results_dir = "%s/%s" % (OUTPUT_DIR, testname)
         print("Saving results to %s" % results_dir)
         check_dir(results_dir)
         print("Dumping configuration in %s" % results_dir)
-        dump_config(results_dir, pattern)
+        dump_config(results_dir, pattern, qdisc_times)
         for index in range(RUNS):
             for transport in TRANSPORT:
                 results_subdir = "%s/%s_run%d" % (results_dir,
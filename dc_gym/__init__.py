@@ -1,3 +1,5 @@
 from gym.envs.registration import register
 
 register(id='dc-iroko-v0', entry_point='dc_gym.env_iroko:DCEnv')
+register(id='dc-sim-v0', entry_point='dc_gym.env_sim:DCEnv')
+register(id='dc-replay-v0', entry_point='dc_gym.env_replay:DCEnv')
@@ -1,6 +1,8 @@
 #include <signal.h>
 #include <stdio.h>
 #include <string.h>
+#include <errno.h>
+#include <time.h>
 
 #include "raw_udp_socket.h"
 
@@ -9,6 +11,11 @@ static struct sigaction prev_handler;
 static uint16_t src_port;
 typedef void (*sighandler_t)(int);
 
+// Per-host status of a broadcast
+#define BW_REPLY_OK 0
+#define BW_REPLY_PENDING 1
+#define BW_REPLY_TIMEOUT 2
+
 void fill_frame(uint8_t *ether_frame) {
 
     struct ethhdr *eth_hdr = (struct ethhdr *)((uint8_t *)ether_frame);
@@ -104,11 +111,105 @@ void walk_ring(struct ring *ring_rx) {
 }
 #endif
 
+#ifdef PACKET_MMAPV2
+static inline int reply_ready(struct ring *ring_rx) {
+    struct tpacket2_hdr *hdr = ring_rx->rd[ring_rx->p_offset].iov_base;
+    return (hdr->tp_status & TP_STATUS_USER) == TP_STATUS_USER;
+}
+
+static inline void release_reply(struct ring *ring_rx) {
+    struct tpacket2_hdr *hdr = ring_rx->rd[ring_rx->p_offset].iov_base;
+    hdr->tp_status = TP_STATUS_KERNEL;
+    ring_rx->p_offset = (ring_rx->p_offset + 1) % ring_rx->rd_num;
+}
+#else
+static inline int reply_ready(struct ring *ring_rx) {
+    struct block_desc *pbd = ring_rx->rd[ring_rx->p_offset].iov_base;
+    return (pbd->h1.block_status & TP_STATUS_USER) == TP_STATUS_USER;
+}
+
+static inline void release_reply(struct ring *ring_rx) {
+    struct block_desc *pbd = ring_rx->rd[ring_rx->p_offset].iov_base;
+    flush_block(pbd);
+    ring_rx->p_offset = (ring_rx->p_offset + 1) % ring_rx->rd_num;
+}
+#endif
+
+static double now_seconds() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
 
 void sighandler(int num) {
     sigint = 1;
 }
 
+/* Send an allocation to every host whose status is BW_REPLY_PENDING and wait
+ * for all replies at once. Each host is marked BW_REPLY_OK together with its
+ * round trip time in seconds or BW_REPLY_TIMEOUT if no reply arrived within
+ * timeout_ms. Returns the number of hosts that did not reply. */
+int broadcast_bw_allocation(const uint64_t *allocations,
+                            struct ring **tx_rings, struct ring **rx_rings,
+                            int num_hosts, uint16_t dst_port, int timeout_ms,
+                            int32_t *status, double *rtts) {
+    struct pollfd pfds[num_hosts];
+    double sent[num_hosts];
+    int pending = 0;
+    int i;
+
+    for (i = 0; i < num_hosts; i++) {
+        pfds[i].fd = -1;
+        pfds[i].events = POLLIN | POLLERR;
+        pfds[i].revents = 0;
+        if (status[i] != BW_REPLY_PENDING)
+            continue;
+        // Drop late replies of earlier broadcasts that timed out
+        while (reply_ready(rx_rings[i]))
+            release_reply(rx_rings[i]);
+        pfds[i].fd = rx_rings[i]->socket;
+        pending++;
+    }
+    for (i = 0; i < num_hosts; i++) {
+        if (pfds[i].fd < 0)
+            continue;
+        sent[i] = now_seconds();
+        send_bw_allocation(allocations[i], tx_rings[i], dst_port);
+    }
+
+    signal(SIGINT, sighandler);
+    double deadline = now_seconds() + timeout_ms / 1000.0;
+    while (pending > 0 && likely(!sigint)) {
+        double now = now_seconds();
+        for (i = 0; i < num_hosts; i++) {
+            if (pfds[i].fd < 0 || !reply_ready(rx_rings[i]))
+                continue;
+            // We only care about packets that pass the bpf filter
+            release_reply(rx_rings[i]);
+            status[i] = BW_REPLY_OK;
+            rtts[i] = now - sent[i];
+            pfds[i].fd = -1;
+            pending--;
+        }
+        int remaining_ms = (int) ((deadline - now) * 1000.0);
+        if (pending == 0 || remaining_ms <= 0)
+            break;
+        if (poll(pfds, num_hosts, remaining_ms) < 0 && errno != EINTR) {
+            perror("poll");
+            break;
+        }
+    }
+    sigaction(SIGINT, &prev_handler, NULL);
+    for (i = 0; i < num_hosts; i++) {
+        if (pfds[i].fd >= 0)
+            status[i] = BW_REPLY_TIMEOUT;
+    }
+    if (sigint)
+        raise(SIGINT);
+    return pending;
+}
+
 void wait_for_reply(struct ring *ring_rx) {
     // Replace the signal handler with the internal C signal handler.
     signal(SIGINT, sighandler);
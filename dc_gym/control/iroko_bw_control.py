@@ -1,6 +1,6 @@
 import os
 import ctypes
-import gevent
+import numpy as np
 
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -9,17 +9,31 @@ class Ring(ctypes.Structure):
     pass
 
 
+class NsControl(ctypes.Structure):
+    pass
+
+
 class BandwidthController():
     SRC_PORT = 20135
     DST_PORT = 20130
     PACKET_RX_RING = 5
     PACKET_TX_RING = 13
+    # Per-host status codes of broadcast_bw_allocation
+    REPLY_SKIPPED = -1
+    REPLY_OK = 0
+    REPLY_PENDING = 1
+    REPLY_TIMEOUT = 2
+    REPLY_ERROR = 3
 
-    def __init__(self, host_ctrl_map):
+    def __init__(self, host_ctrl_map, timeout=0.1, retries=1):
         self.host_ctrl_map = host_ctrl_map
         # self.sock_map = self.bind_sockets(host_ctrl_map)
         self.bw_lib = self.init_backend()
         self.ring_list = self.init_transmissions_rings(host_ctrl_map)
+        self.timeout_ms = int(timeout * 1000)
+        self.retries = retries
+        self.init_ring_arrays(host_ctrl_map)
+        self.init_broadcast_buffers(len(host_ctrl_map))
 
     def init_backend(self):
         bw_lib = ctypes.CDLL(FILE_DIR + '/libbw_control.so')
@@ -29,6 +43,13 @@ class BandwidthController():
         bw_lib.send_bw_allocation.argtypes = [
             ctypes.c_ulong, ctypes.POINTER(Ring), ctypes.c_ushort]
         bw_lib.wait_for_reply.argtypes = [ctypes.POINTER(Ring)]
+        bw_lib.broadcast_bw_allocation.argtypes = [
+            ctypes.POINTER(ctypes.c_uint64),
+            ctypes.POINTER(ctypes.POINTER(Ring)),
+            ctypes.POINTER(ctypes.POINTER(Ring)),
+            ctypes.c_int, ctypes.c_ushort, ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int32), ctypes.POINTER(ctypes.c_double)]
+        bw_lib.broadcast_bw_allocation.restype = ctypes.c_int
         return bw_lib
 
     def init_transmissions_rings(self, host_ctrl_map):
@@ -45,10 +66,57 @@ class BandwidthController():
             ring_list[sw_iface]["tx"] = tx_ring
         return ring_list
 
+    def init_ring_arrays(self, host_ctrl_map):
+        # Rings are ordered like the actions of the agent
+        ring_array = ctypes.POINTER(Ring) * len(host_ctrl_map)
+        self.tx_rings = ring_array(
+            *[self.ring_list[iface]["tx"] for iface in host_ctrl_map])
+        self.rx_rings = ring_array(
+            *[self.ring_list[iface]["rx"] for iface in host_ctrl_map])
+
+    def init_broadcast_buffers(self, num_hosts):
+        self.allocations = np.zeros(num_hosts, dtype=np.uint64)
+        # Status and round trip time in seconds of the last broadcast
+        self.status = np.zeros(num_hosts, dtype=np.int32)
+        self.rtts = np.zeros(num_hosts, dtype=np.float64)
+        # The last rate each host confirmed, unknown at the start
+        self.applied = np.full(num_hosts, np.nan)
+        self.changes = np.zeros(num_hosts, dtype=np.float64)
+        self.suppressed = 0
+        self.set_deadband(0.0, 0.0)
+        self.allocations_ptr = self.allocations.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_uint64))
+        self.status_ptr = self.status.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_int32))
+        self.rtts_ptr = self.rtts.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_double))
+
+    def set_deadband(self, deadband_abs, deadband_rel):
+        """ Skip updates of hosts whose new rate differs from the last
+            confirmed rate by at most deadband_abs bits or by at most
+            deadband_rel times the confirmed rate. Zero disables both. """
+        self.deadband_abs = deadband_abs
+        self.deadband_rel = deadband_rel
+
+    def _apply_deadband(self):
+        # Hosts within the deadband keep their rate and are not contacted
+        if self.deadband_abs <= 0 and self.deadband_rel <= 0:
+            self.suppressed = 0
+            return
+        np.subtract(self.allocations, self.applied, out=self.changes)
+        np.abs(self.changes, out=self.changes)
+        threshold = np.maximum(self.deadband_abs,
+                               self.deadband_rel * self.applied)
+        # Comparisons with unknown rates are False, so these are sent
+        skip = self.changes <= threshold
+        self.status[skip] = self.REPLY_SKIPPED
+        self.suppressed = int(np.count_nonzero(skip))
+
     def destroy_transmissions_rings(self):
         for ring_pair in self.ring_list.values():
             self.bw_lib.teardown_ring(ring_pair["rx"])
             self.bw_lib.teardown_ring(ring_pair["tx"])
+        self.ring_list = {}
 
     def send_cntrl_pckt(self, iface, txrate):
         # Get the tx ring to transmit a packet
@@ -61,20 +129,92 @@ class BandwidthController():
         # we only care about packets that pass the bpf filter
         self.bw_lib.wait_for_reply(rx_ring)
 
+    def _broadcast_pending(self):
+        return self.bw_lib.broadcast_bw_allocation(
+            self.allocations_ptr, self.tx_rings, self.rx_rings,
+            len(self.allocations), self.DST_PORT, self.timeout_ms,
+            self.status_ptr, self.rtts_ptr)
+
     def broadcast_bw(self, txrates, host_ctrl_map):
-        for index, ctrl_iface in enumerate(host_ctrl_map):
-            self.send_cntrl_pckt(ctrl_iface, txrates[index])
-        for ctrl_iface in host_ctrl_map.keys():
-            self.await_response(ctrl_iface)
+        """ Send the rates to all hosts and wait for their replies at once.
+            Hosts that do not reply in time are retried. Returns the number
+            of hosts that never replied, self.status and self.rtts hold the
+            result per host. Updates within the deadband are skipped and
+            counted in self.suppressed. """
+        np.copyto(self.allocations, txrates, casting="unsafe")
+        self.status.fill(self.REPLY_PENDING)
+        self.rtts.fill(-1.0)
+        self._apply_deadband()
+        failed = self._broadcast_pending()
+        for _ in range(self.retries):
+            if not failed:
+                break
+            self.status[self.status > self.REPLY_OK] = self.REPLY_PENDING
+            failed = self._broadcast_pending()
+        confirmed = self.status == self.REPLY_OK
+        self.applied[confirmed] = self.allocations[confirmed]
+        return failed
+
+
+class NetlinkBandwidthController(BandwidthController):
+    """ Sets the rate limiters of the hosts directly from this process.
+        All Mininet hosts share the kernel, so a netlink socket opened in
+        the network namespace of a host can change its tbf. This skips the
+        control network and the node controller processes. """
+
+    def __init__(self, host_ctrl_map, host_netns, max_rate, retries=1):
+        self.host_ctrl_map = host_ctrl_map
+        self.retries = retries
+        self.ns_lib = self.init_backend()
+        self.ns_ctrl = self.init_ns_control(host_netns, max_rate)
+        self.init_broadcast_buffers(len(host_ctrl_map))
+
+    def init_backend(self):
+        ns_lib = ctypes.CDLL(FILE_DIR + '/libns_control.so')
+        ns_lib.init_ns_control.argtypes = [
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_char_p),
+            ctypes.c_int, ctypes.c_uint64]
+        ns_lib.init_ns_control.restype = ctypes.POINTER(NsControl)
+        ns_lib.set_ns_rates.argtypes = [
+            ctypes.POINTER(NsControl), ctypes.POINTER(ctypes.c_uint64),
+            ctypes.POINTER(ctypes.c_int32), ctypes.POINTER(ctypes.c_double)]
+        ns_lib.set_ns_rates.restype = ctypes.c_int
+        ns_lib.destroy_ns_control.argtypes = [ctypes.POINTER(NsControl)]
+        return ns_lib
+
+    def init_ns_control(self, host_netns, max_rate):
+        # host_netns lists the pid and interface of each host in action order
+        num_hosts = len(host_netns)
+        pids = (ctypes.c_int * num_hosts)(*[pid for pid, _ in host_netns])
+        ifaces = (ctypes.c_char_p * num_hosts)(
+            *[iface.encode('ascii') for _, iface in host_netns])
+        ns_ctrl = self.ns_lib.init_ns_control(
+            pids, ifaces, num_hosts, int(max_rate))
+        if not ns_ctrl:
+            print("Could not set up the netlink rate limiters!")
+            exit(1)
+        return ns_ctrl
+
+    def destroy_transmissions_rings(self):
+        if self.ns_ctrl:
+            self.ns_lib.destroy_ns_control(self.ns_ctrl)
+            self.ns_ctrl = None
+
+    def _broadcast_pending(self):
+        return self.ns_lib.set_ns_rates(
+            self.ns_ctrl, self.allocations_ptr, self.status_ptr,
+            self.rtts_ptr)
 
 
 # small script to test the functionality of the bw control operations
 if __name__ == '__main__':
-    test_list = {"test": "c0-eth0", "fest": "c0-eth1",
-                 "nest": "c0-eth2", "quest": "c0-eth3"}
-    ic = BandwidthController("Iroko", test_list)
-    threads = []
-    for iface in test_list.keys():
-        threads.append(gevent.spawn(ic.await_response, iface))
-        ic.send_cntrl_pckt(iface, 20000)
-    gevent.joinall(threads)
+    # Switch ports of the hosts mapped to their control interfaces
+    test_map = {"s1-eth1": "c0-eth0", "s1-eth2": "c0-eth1",
+                "s1-eth3": "c0-eth2", "s1-eth4": "c0-eth3"}
+    ic = BandwidthController(test_map, timeout=0.1, retries=1)
+    failed = ic.broadcast_bw(np.full(len(test_map), 20000), test_map)
+    for index, iface in enumerate(test_map):
+        print("%s: status %d rtt %.3f ms" % (
+            iface, ic.status[index], ic.rtts[index] * 1e3))
+    print("%d hosts did not reply" % failed)
+    ic.destroy_transmissions_rings()
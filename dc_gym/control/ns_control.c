@@ -0,0 +1,176 @@
+#define _GNU_SOURCE
+#include <sched.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <net/if.h>
+
+#include <libnl3/netlink/route/tc.h>
+#include <libnl3/netlink/route/qdisc.h>
+#include <libnl3/netlink/route/qdisc/tbf.h>
+
+// Per-host status of a rate update, shared with bw_control.c
+#define BW_REPLY_OK 0
+#define BW_REPLY_PENDING 1
+#define BW_REPLY_ERROR 3
+
+struct ns_host {
+    struct nl_sock *sock;       // netlink socket bound to the host namespace
+    struct rtnl_qdisc *qdisc;   // rate limiter of the host interface
+};
+
+struct ns_control {
+    struct ns_host *hosts;
+    int num_hosts;
+};
+
+void destroy_ns_control(struct ns_control *ctrl);
+
+static double now_seconds() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static int enter_netns(int pid) {
+    char ns_path[64];
+    snprintf(ns_path, sizeof(ns_path), "/proc/%d/ns/net", pid);
+    int ns_fd = open(ns_path, O_RDONLY);
+    if (ns_fd < 0) {
+        perror(ns_path);
+        return -1;
+    }
+    int err = setns(ns_fd, CLONE_NEWNET);
+    if (err)
+        perror("setns");
+    close(ns_fd);
+    return err;
+}
+
+static void set_tbf_rate(struct rtnl_qdisc *qdisc, uint64_t tx_rate) {
+    // Same parameters as the node controller
+    rtnl_qdisc_tbf_set_limit(qdisc, tx_rate);
+    rtnl_qdisc_tbf_set_rate(qdisc, tx_rate / 8, 15000, 0);
+}
+
+static struct rtnl_qdisc *setup_qdisc(struct nl_sock *sock, int if_index,
+                                      uint64_t max_rate) {
+    struct rtnl_qdisc *qdisc = rtnl_qdisc_alloc();
+    rtnl_tc_set_ifindex(TC_CAST(qdisc), if_index);
+    rtnl_tc_set_parent(TC_CAST(qdisc), TC_H_ROOT);
+    rtnl_tc_set_handle(TC_CAST(qdisc), TC_HANDLE(1, 0));
+    rtnl_tc_set_kind(TC_CAST(qdisc), "tbf");
+    set_tbf_rate(qdisc, max_rate);
+    // Replace whatever root qdisc the interface had before
+    int err = rtnl_qdisc_add(sock, qdisc, NLM_F_CREATE | NLM_F_REPLACE);
+    if (err) {
+        fprintf(stderr, "qdisc_add: %s\n", nl_geterror(err));
+        rtnl_qdisc_put(qdisc);
+        return NULL;
+    }
+    return qdisc;
+}
+
+/* Open one netlink socket inside the network namespace of every host and
+ * install a tbf on its interface. Sockets stay bound to the namespace they
+ * were created in, so the calling thread returns to its own namespace. */
+struct ns_control *init_ns_control(const int *pids, char **ifaces,
+                                   int num_hosts, uint64_t max_rate) {
+    int own_ns = open("/proc/self/ns/net", O_RDONLY);
+    if (own_ns < 0) {
+        perror("/proc/self/ns/net");
+        return NULL;
+    }
+    struct ns_control *ctrl = calloc(1, sizeof(struct ns_control));
+    ctrl->hosts = calloc(num_hosts, sizeof(struct ns_host));
+    ctrl->num_hosts = num_hosts;
+    for (int i = 0; i < num_hosts; i++) {
+        struct ns_host *host = &ctrl->hosts[i];
+        if (enter_netns(pids[i]))
+            goto error;
+        host->sock = nl_socket_alloc();
+        int err = nl_connect(host->sock, NETLINK_ROUTE);
+        if (err) {
+            fprintf(stderr, "nl_connect: %s\n", nl_geterror(err));
+            goto error;
+        }
+        int if_index = if_nametoindex(ifaces[i]);
+        if (!if_index) {
+            perror(ifaces[i]);
+            goto error;
+        }
+        host->qdisc = setup_qdisc(host->sock, if_index, max_rate);
+        if (!host->qdisc)
+            goto error;
+    }
+    setns(own_ns, CLONE_NEWNET);
+    close(own_ns);
+    return ctrl;
+
+error:
+    setns(own_ns, CLONE_NEWNET);
+    close(own_ns);
+    destroy_ns_control(ctrl);
+    return NULL;
+}
+
+/* Update the tbf of every host whose status is BW_REPLY_PENDING. All requests
+ * are sent before the first acknowledgement is read, so the kernel handles
+ * them as one batch. Each host is marked BW_REPLY_OK together with the time
+ * until its acknowledgement in seconds, or BW_REPLY_ERROR. Returns the number
+ * of hosts that could not be updated. */
+int set_ns_rates(struct ns_control *ctrl, const uint64_t *rates,
+                 int32_t *status, double *rtts) {
+    double sent[ctrl->num_hosts];
+    int failed = 0;
+    int i, err;
+
+    for (i = 0; i < ctrl->num_hosts; i++) {
+        struct ns_host *host = &ctrl->hosts[i];
+        struct nl_msg *msg;
+        if (status[i] != BW_REPLY_PENDING)
+            continue;
+        set_tbf_rate(host->qdisc, rates[i]);
+        sent[i] = now_seconds();
+        err = rtnl_qdisc_build_add_request(host->qdisc, NLM_F_REPLACE, &msg);
+        if (!err) {
+            err = nl_send_auto(host->sock, msg);
+            nlmsg_free(msg);
+        }
+        if (err < 0) {
+            fprintf(stderr, "qdisc_add: %s\n", nl_geterror(err));
+            status[i] = BW_REPLY_ERROR;
+            failed++;
+        }
+    }
+    for (i = 0; i < ctrl->num_hosts; i++) {
+        if (status[i] != BW_REPLY_PENDING)
+            continue;
+        err = nl_wait_for_ack(ctrl->hosts[i].sock);
+        if (err < 0) {
+            fprintf(stderr, "qdisc_add: %s\n", nl_geterror(err));
+            status[i] = BW_REPLY_ERROR;
+            failed++;
+            continue;
+        }
+        status[i] = BW_REPLY_OK;
+        rtts[i] = now_seconds() - sent[i];
+    }
+    return failed;
+}
+
+void destroy_ns_control(struct ns_control *ctrl) {
+    if (!ctrl)
+        return;
+    for (int i = 0; i < ctrl->num_hosts; i++) {
+        if (ctrl->hosts[i].qdisc)
+            rtnl_qdisc_put(ctrl->hosts[i].qdisc);
+        if (ctrl->hosts[i].sock)
+            nl_socket_free(ctrl->hosts[i].sock);
+    }
+    free(ctrl->hosts);
+    free(ctrl);
+}
@@ -30,6 +30,29 @@ def bpf_stmt(code, k):
     return bpf_jump(code, k, 0, 0)
 
 
+def attach_filter(sock, filters_list):
+    # Create filters struct and fprog struct to be used by SO_ATTACH_FILTER, as
+    # defined in linux/filter.h.
+    filters = b''.join(filters_list)
+    b = create_string_buffer(filters)
+    mem_addr_of_filters = addressof(b)
+    fprog = pack('HL', len(filters_list), mem_addr_of_filters)
+    sock.setsockopt(SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def attach_ipv4_filter(sock, snap_len):
+    filters_list = [
+        # Must be IPv4 (check ethertype field at byte offset 12)
+        bpf_stmt(BPF_LD | BPF_H | BPF_ABS, 12),
+        bpf_jump(BPF_JMP | BPF_JEQ | BPF_K, 0x0800, 0, 1),
+
+        # pass, but only copy the first snap_len bytes of the frame
+        bpf_stmt(BPF_RET | BPF_K, snap_len),
+        bpf_stmt(BPF_RET | BPF_K, 0),  # reject
+    ]
+    attach_filter(sock, filters_list)
+
+
 def attach_port_filter(sock, port_num):
     # Ordering of the filters is backwards of what would be intuitive for
     # performance reasons: the check that is most likely to fail is first.
@@ -51,10 +74,4 @@ def attach_port_filter(sock, port_num):
         bpf_stmt(BPF_RET | BPF_K, 0x0fffffff),  # pass
         bpf_stmt(BPF_RET | BPF_K, 0),  # reject
     ]
-    # Create filters struct and fprog struct to be used by SO_ATTACH_FILTER, as
-    # defined in linux/filter.h.
-    filters = b''.join(filters_list)
-    b = create_string_buffer(filters)
-    mem_addr_of_filters = addressof(b)
-    fprog = pack('HL', len(filters_list), mem_addr_of_filters)
-    sock.setsockopt(SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+    attach_filter(sock, filters_list)
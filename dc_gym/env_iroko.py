@@ -1,13 +1,18 @@
+import os
 import time
 import sys
+import copy
 import atexit
 import numpy as np
 from gym import Env as openAIGym, spaces
 from dc_gym.control.iroko_bw_control import BandwidthController
+from dc_gym.control.iroko_bw_control import NetlinkBandwidthController
 # from tqdm import tqdm
 
 from iroko_traffic import TrafficGen
-from iroko_state import StateManager
+from iroko_state import StateManager, get_obs_shape
+from iroko_profile import StepProfiler
+from iroko_norm import create_normalizer
 from factories import TopoFactory
 
 DEFAULT_CONF = {
@@ -19,6 +24,8 @@ DEFAULT_CONF = {
     "output_dir": "../results/",
     # When to take state samples. Defaults to taking a sample at every step.
     "sample_delta": 1,
+    # How many samples are buffered in memory before they are written out.
+    "trace_chunk": 1000,
     # Basic environment name.
     "env": "iroko",
     # Use the simplest topology for tests.
@@ -39,6 +46,52 @@ DEFAULT_CONF = {
     "state_model": ["backlog", "d_backlog"],
     # Add the flow matrix to state?
     "collect_flows": False,
+    # How flows are encoded in the state. 0 adds a source and destination
+    # column for every host to each port. N > 0 lists the indices of up to
+    # N active source and destination hosts per port instead (1-based, 0
+    # marks an empty slot), so the state does not grow with the hosts.
+    "flow_slots": 0,
+    # Number of consecutive observations stacked into the state, the
+    # oldest comes first. 1 returns only the latest observation.
+    "obs_history": 1,
+    # How a step waits for its observation:
+    # "fixed": sleep until WAIT seconds have passed since the last step
+    # "fresh": block until all collectors sampled after the action was set
+    "step_mode": "fixed",
+    # Maximum seconds a "fresh" step waits for new samples.
+    "step_deadline": 0.5,
+    # How actions reach the rate limiters of the hosts:
+    # "udp": control packets to a node controller on every host
+    # "netlink": set all host rate limiters directly from the environment
+    "ctrl_backend": "udp",
+    # Seconds to wait for hosts to confirm a new rate before retrying.
+    "ctrl_timeout": 0.1,
+    # How often hosts that did not confirm a rate are retried per step.
+    "ctrl_retries": 1,
+    # Only update a host if its rate changed by more than this many bits
+    # and by more than this fraction of its current rate. 0 disables both.
+    "deadband_abs": 0,
+    "deadband_rel": 0.0,
+    # Reuse the running network on reset if the topology did not change.
+    # Only traffic, queues, and host rates are reset in that case.
+    "soft_reset": False,
+    # Maximum seconds a soft reset waits for the switch queues to drain.
+    "drain_timeout": 2.0,
+    # Time the phases of every step, the summary is written next to the
+    # runtime statistics when the environment is killed.
+    "profile": True,
+    # Also report the phase times of each step in its info dict.
+    "profile_info": False,
+    # Normalize every observation feature with its running mean and
+    # variance. Observations become float32 instead of raw int64 counters.
+    "obs_norm": False,
+    # Normalized observations are clipped to this many standard deviations.
+    "obs_norm_clip": 10.0,
+    # Keep updating the statistics, disable to evaluate a trained agent.
+    "obs_norm_update": True,
+    # Restore the statistics from this file. They are saved as
+    # obs_norm.npz next to the runtime statistics when the env is killed.
+    "obs_norm_file": None,
     # Specifies which variables represent the state of the environment:
     # Eligible variables:
     # "action", "bw", "backlog","std_dev"
@@ -46,8 +99,23 @@ DEFAULT_CONF = {
 }
 
 
+def create_obs_space(conf, obs_shape, obs_norm=None):
+    """ Return the observation normalizer and the flat observation space
+        for observations of obs_shape. The statistics of obs_norm are kept
+        unless the shape changed. """
+    if obs_norm is None or obs_norm.shape != obs_shape:
+        obs_norm = create_normalizer(conf, obs_shape)
+    obs_dtype = np.int64 if obs_norm is None else np.float32
+    obs_space = spaces.Box(low=-np.inf, high=np.inf, dtype=obs_dtype,
+                           shape=(int(np.prod(obs_shape)),))
+    return obs_norm, obs_space
+
+
 class DCEnv(openAIGym):
     WAIT = 0.05      # amount of seconds the agent waits per iteration
+    # Phases of a step in the order they are timed
+    STEP_PHASES = ["actuate", "wait", "read", "state", "reward", "trace",
+                   "norm"]
     ACTION_MIN = 0.001
     ACTION_MAX = 1.0
     __slots__ = ["conf", "topo", "traffic_gen", "state_man", "steps",
@@ -55,11 +123,15 @@ class DCEnv(openAIGym):
                  "input_file", "output_dir", "start_time"]
 
     def __init__(self, conf={}):
-        self.conf = DEFAULT_CONF
+        # Copy the defaults, they must not carry over to the next env
+        self.conf = copy.deepcopy(DEFAULT_CONF)
         self.conf.update(conf)
         self.active = False
+        # Phase times are kept across resets
+        self.profiler = StepProfiler(self.STEP_PHASES, self.conf["profile"])
         # initialize the topology
         self.topo = self._create_topo(self.conf)
+        self.obs_norm = None
 
         # set the dimensions of the state matrix
         self._set_gym_spaces(self.conf)
@@ -76,14 +148,15 @@ class DCEnv(openAIGym):
 
     def _start_env(self):
         self.topo.start_network()
-        # initialize the traffic generator and state manager
-        self.traffic_gen = TrafficGen(self.topo, self.conf["transport"])
-        self.state_man = StateManager(self.topo, self.conf)
-        self.bw_ctrl = BandwidthController(self.topo.host_ctrl_map)
+        self._init_backend()
+        self.state_man.profiler = self.profiler
 
         # set up variables for the progress bar
         self.steps = 0
         self.reward = 0
+        self.pred_bw = None
+        self.applied = None
+        self.observed = self.state_man._now()
         # self.progress_bar = tqdm(total=self.conf["iterations"], leave=False)
         # self.progress_bar.clear()
 
@@ -92,31 +165,86 @@ class DCEnv(openAIGym):
         self.start_time = time.time()
         self.active = True
 
+    def _init_backend(self):
+        # initialize the traffic generator and state manager
+        use_netlink = self.conf["ctrl_backend"] == "netlink"
+        self.traffic_gen = TrafficGen(self.topo, self.conf["transport"],
+                                      node_ctrl=not use_netlink)
+        self.state_man = StateManager(self.topo, self.conf)
+        if use_netlink:
+            self.bw_ctrl = NetlinkBandwidthController(
+                self.topo.host_ctrl_map, self.topo.get_host_netns(),
+                self.topo.conf["max_capacity"], self.conf["ctrl_retries"])
+        else:
+            self.bw_ctrl = BandwidthController(self.topo.host_ctrl_map,
+                                               self.conf["ctrl_timeout"],
+                                               self.conf["ctrl_retries"])
+        self.bw_ctrl.set_deadband(self.conf["deadband_abs"],
+                                  self.conf["deadband_rel"])
+
     def reset(self):
+        topo_changed = self._topo_changed(self.conf)
+        if self.conf["soft_reset"] and self.active and not topo_changed:
+            print("Resetting environment...")
+            self._soft_reset()
+            return np.zeros(self.observation_space.shape,
+                            dtype=self.observation_space.dtype)
         print("Stopping environment...")
         self.kill_env()
+        self.active = False
+        if topo_changed:
+            print("Topology configuration changed, rebuilding...")
+            self.topo = self._create_topo(self.conf)
+            self._set_gym_spaces(self.conf)
         print("Starting environment...")
         self._start_env()
-        return np.zeros(self.observation_space.shape)
+        return np.zeros(self.observation_space.shape,
+                        dtype=self.observation_space.dtype)
+
+    def _soft_reset(self):
+        # Keep the network, switches, collectors, and controllers alive
+        self.traffic_gen.stop_traffic(keep_controllers=True)
+        if not self.state_man.wait_for_drain(self.conf["drain_timeout"]):
+            print("Queues did not drain within %.1f seconds" %
+                  self.conf["drain_timeout"])
+        max_rates = np.full(self.action_space.shape,
+                            self.topo.conf["max_capacity"])
+        self.bw_ctrl.broadcast_bw(max_rates, self.topo.host_ctrl_map)
+        self.steps = 0
+        self.reward = 0
+        self.applied = None
+        self.start_traffic()
+        self.state_man.reset()
+        self.observed = self.state_man._now()
+        self.start_time = time.time()
+
+    def _topo_spec(self, conf):
+        return conf["topo"], conf["agent"].lower(), conf["topo_conf"]
+
+    def _topo_changed(self, conf):
+        return self._topo_spec(conf) != self.topo_spec
 
     def _create_topo(self, conf):
         conf["topo_conf"]["tcp_policy"] = conf["agent"].lower()
         # conf["topo_conf"]["parallel_envs"] = conf["parallel_envs"]
+        # Remember what the topology was built from to detect changes
+        self.topo_spec = copy.deepcopy(self._topo_spec(conf))
+        return self._build_topo(conf)
+
+    def _build_topo(self, conf):
         return TopoFactory.create(conf["topo"], conf["topo_conf"])
 
     def _set_gym_spaces(self, conf):
         # set configuration for the gym environment
         num_ports = self.topo.get_num_sw_ports()
         num_actions = self.topo.get_num_hosts()
-        num_features = len(self.conf["state_model"])
-        if self.conf["collect_flows"]:
-            num_features += num_actions * 2
         self.action_space = spaces.Box(
             low=self.ACTION_MIN, high=self.ACTION_MAX,
             dtype=np.float32, shape=(num_actions,))
-        self.observation_space = spaces.Box(
-            low=-np.inf, high=np.inf, dtype=np.int64,
-            shape=(num_ports * num_features,))
+        obs_shape = get_obs_shape(conf, num_ports, num_actions)
+        # Statistics are kept across resets unless the shape changes
+        self.obs_norm, self.observation_space = create_obs_space(
+            conf, obs_shape, self.obs_norm)
 
     def set_traffic_matrix(self, index):
         traffic_file = self.topo.get_traffic_pattern(index)
@@ -125,28 +253,78 @@ class DCEnv(openAIGym):
         self.output_dir = '%s' % (self.conf["output_dir"])
 
     def step(self, action):
+        self.step_async(action)
+        return self.step_wait()
+
+    def step_async(self, action):
+        """ Apply the action and return right away. The observation window
+            runs while the caller works, step_wait collects the result. """
         self.steps = self.steps + 1
         # self.progress_bar.set_postfix_str(s="%.3f reward" % self.reward)
         # self.progress_bar.update(1)
 
-        # done = not self.is_traffic_proc_alive()
-        done = False
-
-        pred_bw = action * self.topo.conf["max_capacity"]
+        self.profiler.tic(new_step=True)
+        self.pred_bw = action * self.topo.conf["max_capacity"]
         # print("Iteration %d Actions: " % self.steps, end='')
         # for index, h_iface in enumerate(self.topo.host_ctrl_map):
         #     rate = action[index] * 10
         #     print(" %s:%.3f " % (h_iface, rate), end='')
         # print('')
-        self.bw_ctrl.broadcast_bw(pred_bw, self.topo.host_ctrl_map)
+        self.ctrl_failed = self.bw_ctrl.broadcast_bw(
+            self.pred_bw, self.topo.host_ctrl_map)
+        self.profiler.toc("actuate")
+        # Keep track of the control period between two actions. All times
+        # are in the clock of the samples, simulated seconds in the sim.
+        applied = self.state_man._now()
+        self.ctrl_period = 0.0
+        if self.applied is not None:
+            self.ctrl_period = applied - self.applied
+        self.act_delay = applied - self.observed
+        self.applied = applied
 
-        # observe for WAIT seconds minus time needed for computation
-        max_sleep = max(self.WAIT - (time.time() - self.start_time), 0)
-        time.sleep(max_sleep)
-        self.start_time = time.time()
+    def step_wait(self):
+        """ Wait for the end of the observation window of the last action
+            and return its observation, reward, and info. """
+        # done = not self.is_traffic_proc_alive()
+        done = False
+        self.profiler.tic()
+        deadline_missed = self._wait_for_obs()
+        self.profiler.toc("wait")
         do_sample = (self.steps % self.conf["sample_delta"]) == 0
-        obs, self.reward = self.state_man.observe(pred_bw, do_sample)
-        return obs.flatten(), self.reward, done, {}
+        obs, self.reward = self.state_man.observe(self.pred_bw, do_sample)
+        if self.obs_norm is not None:
+            obs = self.obs_norm.normalize(obs)
+            self.profiler.toc("norm")
+        self.observed = self.state_man._now()
+        info = {"obs_age": self.state_man.get_obs_age(),
+                "deadline_missed": deadline_missed,
+                "ctrl_failed": self.ctrl_failed,
+                "ctrl_suppressed": self.bw_ctrl.suppressed,
+                "ctrl_rtts": self.bw_ctrl.rtts.copy(),
+                # Seconds between the last two actions
+                "ctrl_period": self.ctrl_period,
+                # Seconds from the previous observation to this action
+                "act_delay": self.act_delay,
+                "reward_parts": self.state_man.get_reward_components()}
+        if self.conf["profile_info"]:
+            info["profile"] = self.profiler.get_last()
+        return obs.flatten(), self.reward, done, info
+
+    def _wait_for_obs(self):
+        """ Wait until the observation of the action that was just set is
+            due. Returns True if the step took longer than planned. """
+        if self.conf["step_mode"] == "fresh":
+            # only observe samples that were taken under the new action,
+            # samples taken since step_async applied it already count
+            deadline_missed = not self.state_man.wait_for_samples(
+                self.applied, self.conf["step_deadline"])
+        else:
+            # observe for WAIT seconds minus time needed for computation
+            elapsed = time.time() - self.start_time
+            deadline_missed = elapsed > self.WAIT
+            time.sleep(max(self.WAIT - elapsed, 0))
+        self.start_time = time.time()
+        return deadline_missed
 
     def render(self, mode='human'):
         raise NotImplementedError("Method render not implemented!")
@@ -166,6 +344,8 @@ class DCEnv(openAIGym):
         if hasattr(self, 'state_man'):
             print("Cleaning all state")
             self.state_man.terminate()
+        if hasattr(self, 'bw_ctrl'):
+            self.bw_ctrl.destroy_transmissions_rings()
         if hasattr(self, 'traffic_gen'):
             print("Stopping traffic")
             self.traffic_gen.stop_traffic()
@@ -175,8 +355,20 @@ class DCEnv(openAIGym):
         if hasattr(self, 'state_man'):
             print("Removing the state manager.")
             self.state_man.flush_and_close()
+        self.profiler.print_summary()
+        if os.path.isdir(self.conf["output_dir"]):
+            self.profiler.dump("%s/step_profile.json" %
+                               self.conf["output_dir"])
+            if self.obs_norm is not None and self.obs_norm.count:
+                self.obs_norm.save("%s/obs_norm.npz" %
+                                   self.conf["output_dir"])
         print("Done with destroying myself.")
 
+    def get_profile(self):
+        """ Return count, mean, p50, p95, p99, and max of every phase of
+            the steps so far in seconds. """
+        return self.profiler.summary()
+
     def is_traffic_proc_alive(self):
         return self.traffic_gen.traffic_is_active()
 
@@ -0,0 +1,148 @@
+import numpy as np
+from gym import Env as openAIGym, spaces
+
+from env_iroko import DEFAULT_CONF as IROKO_CONF, create_obs_space
+from iroko_state import StateManager, get_obs_shape
+from iroko_trace import load_trace, load_header
+
+DEFAULT_CONF = {
+    # The trace to replay. Defaults to the trace in the output folder.
+    "replay_trace": None,
+    # Advance this many recorded steps per step of the agent.
+    "replay_stride": 1,
+    # Number of agent steps per episode, 0 replays the whole trace.
+    # Every reset continues with the next window of the trace.
+    "replay_window": 0,
+}
+
+
+class TraceReplay(object):
+    """ Serves the recorded stats of a trace one step at a time, with the
+        read interface of a collector. """
+
+    def __init__(self, trace_dir, stats_dict):
+        stat_names = sorted(stats_dict, key=stats_dict.get)
+        trace = load_trace(trace_dir, stat_names)
+        # Load the whole trace, replay should not wait for the disk
+        self.stats = np.stack([trace[name] for name in stat_names], axis=1)
+        self.index = 0
+
+    def __len__(self):
+        return len(self.stats)
+
+    def read(self, dst):
+        dst[:] = self.stats[self.index]
+        # The recorded step is the time stamp of the sample
+        return float(self.index)
+
+
+class ReplayStateManager(StateManager):
+    """ Builds observations and rewards from a recorded trace instead of
+        the collectors of a running network. """
+    __slots__ = ["replay"]
+
+    def __init__(self, replay, meta, config):
+        self.replay = replay
+        self._init_state(config, meta["sw_ports"], meta["host_ports"], [],
+                         meta["max_queue"], meta["max_capacity"])
+
+    def _spawn_collectors(self, sw_ports, host_ports, host_ips):
+        # The trace is the only source of stats
+        self.collectors.append(self.replay)
+
+    def _now(self):
+        return float(self.replay.index)
+
+    def flush_and_close(self):
+        pass
+
+
+class DCEnv(openAIGym):
+    """ Replays a recorded runtime_statistics trace as observations. The
+        reward is computed from the recorded stats and the actions of the
+        agent, so runs are deterministic and need no network. Select it
+        with conf["env"] = "replay". """
+    ACTION_MIN = 0.001
+    ACTION_MAX = 1.0
+
+    def __init__(self, conf={}):
+        self.conf = dict(IROKO_CONF)
+        self.conf.update(DEFAULT_CONF)
+        self.conf.update(conf)
+        if self.conf["collect_flows"]:
+            print("Fatal: Traces do not contain flows!")
+            exit(1)
+        trace_dir = self.conf["replay_trace"]
+        if trace_dir is None:
+            trace_dir = "%s/runtime_statistics" % self.conf["output_dir"]
+        meta = load_header(trace_dir)["meta"]
+        for key in ("stats_dict", "sw_ports", "host_ports",
+                    "max_queue", "max_capacity"):
+            if key not in meta:
+                print("Fatal: Trace %s does not record %s!" % (trace_dir, key))
+                exit(1)
+        if meta["stats_dict"] != StateManager.STATS_DICT:
+            print("Fatal: Trace %s has a different stats layout!" % trace_dir)
+            exit(1)
+        self.max_capacity = meta["max_capacity"]
+        self.replay = TraceReplay(trace_dir, meta["stats_dict"])
+        self.stride = self.conf["replay_stride"]
+        self.window = self.conf["replay_window"]
+        if len(self.replay) <= self.stride:
+            print("Fatal: Trace %s is too short to replay!" % trace_dir)
+            exit(1)
+        if self.window <= 0:
+            self.window = (len(self.replay) - 1) // self.stride
+        if self.window * self.stride >= len(self.replay):
+            print("Fatal: A window of %d steps does not fit into the %d "
+                  "steps of trace %s!" % (self.window, len(self.replay),
+                                          trace_dir))
+            exit(1)
+        self.window_start = 0
+        self.steps = 0
+        self.reward = 0
+        self.state_man = ReplayStateManager(self.replay, meta, self.conf)
+        self._set_gym_spaces(len(meta["host_ports"]),
+                             len(meta["sw_ports"]))
+
+    def _set_gym_spaces(self, num_actions, num_ports):
+        self.action_space = spaces.Box(
+            low=self.ACTION_MIN, high=self.ACTION_MAX,
+            dtype=np.float32, shape=(num_actions,))
+        obs_shape = get_obs_shape(self.conf, num_ports, num_actions)
+        self.obs_norm, self.observation_space = create_obs_space(
+            self.conf, obs_shape)
+
+    def reset(self):
+        # Continue with the next window, wrap around at the end of the trace
+        window_len = self.window * self.stride
+        if self.steps:
+            self.window_start += window_len
+        if self.window_start + window_len >= len(self.replay):
+            self.window_start = 0
+        self.replay.index = self.window_start
+        self.steps = 0
+        self.reward = 0
+        self.state_man.reset()
+        return np.zeros(self.observation_space.shape,
+                        dtype=self.observation_space.dtype)
+
+    def step(self, action):
+        self.steps = self.steps + 1
+        self.replay.index += self.stride
+        pred_bw = action * self.max_capacity
+        obs, self.reward = self.state_man.observe(pred_bw, False)
+        if self.obs_norm is not None:
+            obs = self.obs_norm.normalize(obs)
+        done = self.steps >= self.window
+        info = {"trace_step": self.replay.index,
+                "reward_parts": self.state_man.get_reward_components()}
+        return obs.flatten(), self.reward, done, info
+
+    def render(self, mode='human'):
+        raise NotImplementedError("Method render not implemented!")
+
+    def kill_env(self):
+        if self.obs_norm is not None and self.obs_norm.count:
+            self.obs_norm.save("%s/obs_norm.npz" % self.conf["output_dir"])
+        print("Done with destroying myself.")
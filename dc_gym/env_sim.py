@@ -0,0 +1,73 @@
+from env_iroko import DCEnv as IrokoEnv
+from iroko_state import StateManager
+from iroko_sim import FluidNetwork, SimTopoConfig, SimEngine
+from iroko_sim import SimQueueCollector, SimBandwidthCollector
+from iroko_sim import SimFlowCollector, SimTrafficGen, SimBandwidthController
+
+DEFAULT_CONF = {
+    # Seconds of simulated time per update of the network model. Coarser
+    # ticks run faster but model TCP less accurately, see the README.
+    "sim_tick": 0.005,
+    # Round trip time of an empty network in seconds, paces TCP flows.
+    "sim_rtt": 0.0005,
+}
+
+
+class SimStateManager(StateManager):
+    """ Samples the network model instead of the switches of a Mininet
+        network. Time stamps and timeouts are in simulated seconds. """
+    __slots__ = ["network"]
+
+    def __init__(self, topo_conf, config, network):
+        self.network = network
+        StateManager.__init__(self, topo_conf, config)
+
+    def _spawn_collectors(self, sw_ports, host_ports, host_ips):
+        self.collectors.append(SimQueueCollector(
+            self.network, sw_ports, self.stats, self.STATS_DICT))
+        self.collectors.append(SimBandwidthCollector(
+            self.network, sw_ports, self.stats, self.STATS_DICT))
+        if (self.collect_flows):
+            self.collectors.append(SimFlowCollector(
+                self.network, sw_ports, self.flow_stats,
+                sparse=self.flow_slots > 0))
+        self.engine = SimEngine(self.network, self.collectors)
+        self.engine.start()
+
+    def _now(self):
+        return self.network.now
+
+    def advance(self, duration):
+        self.engine.advance(duration)
+
+
+class DCEnv(IrokoEnv):
+    """ The iroko environment on a fluid model of the network. Needs
+        neither root nor Mininet, and steps advance simulated time instead
+        of sleeping. Select it with conf["env"] = "sim". """
+
+    def __init__(self, conf={}):
+        self.conf = dict(DEFAULT_CONF)
+        self.conf.update(conf)
+        IrokoEnv.__init__(self, self.conf)
+
+    def _build_topo(self, conf):
+        return SimTopoConfig(conf["topo"], conf["topo_conf"])
+
+    def _init_backend(self):
+        self.network = FluidNetwork(self.topo, self.conf["sim_tick"],
+                                    self.conf["sim_rtt"])
+        self.traffic_gen = SimTrafficGen(self.network, self.conf["transport"])
+        self.state_man = SimStateManager(self.topo, self.conf, self.network)
+        self.bw_ctrl = SimBandwidthController(self.topo.host_ctrl_map,
+                                              self.network)
+        self.bw_ctrl.set_deadband(self.conf["deadband_abs"],
+                                  self.conf["deadband_rel"])
+
+    def _wait_for_obs(self):
+        if self.conf["step_mode"] == "fresh":
+            # only observe samples that were taken under the new action
+            return not self.state_man.wait_for_samples(
+                self.applied, self.conf["step_deadline"])
+        self.state_man.advance(self.WAIT)
+        return False
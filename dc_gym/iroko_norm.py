@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class ObsNormalizer(object):
+    """ Normalizes observations with the running mean and variance of every
+        feature. The statistics are updated in place with Welford's
+        algorithm and the normalized observation is written into a
+        preallocated float32 buffer, which is overwritten by the next
+        call. """
+
+    def __init__(self, shape, clip=10.0, update=True, epsilon=1e-8):
+        self.shape = tuple(shape)
+        self.clip = clip
+        self.update = update
+        self.epsilon = epsilon
+        self.count = 0
+        self.mean = np.zeros(self.shape)
+        self.m2 = np.zeros(self.shape)
+        # Scratch buffers, no allocations per step
+        self.delta = np.zeros(self.shape)
+        self.tmp = np.zeros(self.shape)
+        self.out = np.zeros(self.shape, dtype=np.float32)
+
+    def _update_stats(self, obs):
+        self.count += 1
+        np.subtract(obs, self.mean, out=self.delta)
+        np.divide(self.delta, self.count, out=self.tmp)
+        self.mean += self.tmp
+        np.subtract(obs, self.mean, out=self.tmp)
+        self.tmp *= self.delta
+        self.m2 += self.tmp
+
+    def get_std(self):
+        if self.count == 0:
+            return np.ones(self.shape)
+        return np.sqrt(self.m2 / self.count + self.epsilon)
+
+    def normalize(self, obs):
+        """ Update the statistics with obs if enabled and return the
+            normalized observation. """
+        if self.update:
+            self._update_stats(obs)
+        np.subtract(obs, self.mean, out=self.delta)
+        if self.count:
+            np.divide(self.m2, self.count, out=self.tmp)
+            self.tmp += self.epsilon
+            np.sqrt(self.tmp, out=self.tmp)
+            self.delta /= self.tmp
+        np.clip(self.delta, -self.clip, self.clip, out=self.delta)
+        np.copyto(self.out, self.delta, casting="same_kind")
+        return self.out
+
+    def get_state(self):
+        return {"count": self.count, "mean": self.mean.copy(),
+                "m2": self.m2.copy()}
+
+    def set_state(self, state):
+        if tuple(np.shape(state["mean"])) != self.shape:
+            raise ValueError("Normalizer state has shape %s, expected %s" %
+                             (np.shape(state["mean"]), self.shape))
+        self.count = int(state["count"])
+        np.copyto(self.mean, state["mean"])
+        np.copyto(self.m2, state["m2"])
+
+    def save(self, path):
+        state = self.get_state()
+        with open(path, "wb") as norm_file:
+            np.savez(norm_file, **state)
+
+    def load(self, path):
+        state = np.load(path)
+        self.set_state({key: state[key] for key in state.files})
+
+
+def create_normalizer(conf, shape):
+    """ Return the observation normalizer configured in the env conf or
+        None if observations are not normalized. """
+    if not conf["obs_norm"]:
+        return None
+    obs_norm = ObsNormalizer(shape, conf["obs_norm_clip"],
+                             conf["obs_norm_update"])
+    if conf["obs_norm_file"]:
+        print("Restoring observation statistics from %s" %
+              conf["obs_norm_file"])
+        try:
+            obs_norm.load(conf["obs_norm_file"])
+        except (IOError, ValueError) as e:
+            print("Fatal: Could not restore %s:" % conf["obs_norm_file"], e)
+            exit(1)
+    return obs_norm
@@ -0,0 +1,120 @@
+from __future__ import print_function
+import json
+import math
+import numpy as np
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+
+class StepProfiler(object):
+    """ Times consecutive phases of a step with the monotonic clock. Every
+        phase has a fixed-size histogram with logarithmic bins, so memory
+        and overhead do not grow with the number of steps. Percentiles are
+        accurate to the width of a bin, about 12%. """
+    # Range of the histograms in seconds
+    MIN_TIME = 1e-6
+    MAX_TIME = 100.0
+    BINS_PER_DECADE = 20
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, phases, enabled=True):
+        self.enabled = enabled
+        self.phases = list(phases)
+        self.phase_index = {}
+        for index, phase in enumerate(self.phases):
+            self.phase_index[phase] = index
+        # The first bin holds shorter, the last bin longer durations
+        decades = math.log10(self.MAX_TIME / self.MIN_TIME)
+        self.num_bins = int(decades * self.BINS_PER_DECADE) + 2
+        self.hist = np.zeros((len(self.phases), self.num_bins),
+                             dtype=np.int64)
+        self.reset()
+        self.start = monotonic()
+
+    def reset(self):
+        self.hist.fill(0)
+        self.count = [0] * len(self.phases)
+        self.total = [0.0] * len(self.phases)
+        self.max = [0.0] * len(self.phases)
+        self.last = [0.0] * len(self.phases)
+
+    def tic(self, new_step=False):
+        """ Start timing the next phase. A new step forgets the phase times
+            of the last one, phases that do not run report 0. """
+        if new_step:
+            self.last = [0.0] * len(self.phases)
+        self.start = monotonic()
+
+    def toc(self, phase):
+        """ Record the time since the last tic or toc as phase. """
+        if not self.enabled:
+            return
+        now = monotonic()
+        self.record(phase, now - self.start)
+        self.start = now
+
+    def record(self, phase, seconds):
+        index = self.phase_index[phase]
+        if seconds < self.MIN_TIME:
+            hist_bin = 0
+        else:
+            hist_bin = int(math.log10(seconds / self.MIN_TIME) *
+                           self.BINS_PER_DECADE) + 1
+            hist_bin = min(hist_bin, self.num_bins - 1)
+        self.hist[index, hist_bin] += 1
+        self.count[index] += 1
+        self.total[index] += seconds
+        self.last[index] = seconds
+        if seconds > self.max[index]:
+            self.max[index] = seconds
+
+    def get_last(self):
+        """ Return the duration of every phase in the last step. """
+        return dict(zip(self.phases, self.last))
+
+    def _percentile(self, index, percentile):
+        # Upper edge of the bin that contains the percentile
+        rank = percentile / 100.0 * self.count[index]
+        hist_bin = int(np.searchsorted(np.cumsum(self.hist[index]), rank))
+        edge = self.MIN_TIME * 10**(float(hist_bin) / self.BINS_PER_DECADE)
+        return min(edge, self.max[index])
+
+    def summary(self):
+        """ Return count, mean, percentiles, and maximum of every phase
+            that was recorded at least once. """
+        summary = {}
+        for index, phase in enumerate(self.phases):
+            count = self.count[index]
+            if not count:
+                continue
+            stats = {"count": count, "mean": self.total[index] / count,
+                     "max": self.max[index]}
+            for percentile in self.PERCENTILES:
+                stats["p%d" % percentile] = self._percentile(
+                    index, percentile)
+            summary[phase] = stats
+        return summary
+
+    def dump(self, path):
+        summary = self.summary()
+        if not summary:
+            return
+        with open(path, "w") as json_file:
+            json.dump({"phases": self.phases, "summary": summary},
+                      json_file, indent=2)
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print("%-10s %8s %10s %10s %10s %10s" %
+              ("phase", "count", "p50", "p95", "p99", "max"))
+        for phase in self.phases:
+            if phase not in summary:
+                continue
+            stats = summary[phase]
+            print("%-10s %8d %9.3fms %9.3fms %9.3fms %9.3fms" % (
+                phase, stats["count"], stats["p50"] * 1e3,
+                stats["p95"] * 1e3, stats["p99"] * 1e3, stats["max"] * 1e3))
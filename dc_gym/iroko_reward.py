@@ -3,6 +3,9 @@ import numpy as np
 
 
 class RewardFunction:
+    # Order in which the components of the reward model are summed up
+    COMPONENTS = ["action", "bw", "backlog", "std_dev"]
+
     def __init__(self, host_ports, sw_ports, reward_model,
                  max_queue, max_bw, stats_dict):
         self.sw_ports = sw_ports
@@ -12,66 +15,60 @@ class RewardFunction:
         self.max_queue = max_queue
         self.max_bw = max_bw
         self.stats_dict = stats_dict
+        # Switch ports that lead to a host, computed once
+        host_set = set(host_ports)
+        self.host_mask = np.array([iface in host_set for iface in sw_ports],
+                                  dtype=bool)
+        self.queue_weight = self.num_sw_ports / float(len(host_ports)) * 5
+        self.queue_buf = np.zeros(self.num_sw_ports)
+        # The value of every configured component of the last reward
+        self.components = [component for component in self.COMPONENTS
+                           if component in reward_model]
+        self.values = np.zeros(len(self.components))
+        self.reward_funcs = [getattr(self, "_%s_reward" % component)
+                             for component in self.components]
 
     def get_reward(self, stats, deltas, actions):
-        reward = 0
-        if "action" in self.reward_model:
-            action_reward = self._action_reward(actions)
-            # print("action: %f " % action_reward, end='')
-            reward += action_reward
-        if "bw" in self.reward_model:
-            bw_reward = self._bw_reward(stats)
-            # print("bw: %f " % bw_reward, end='')
-            bw_reward = self._adjust_reward(bw_reward, deltas)
-            reward += bw_reward
-        if "backlog" in self.reward_model:
-            queue_reward = self._queue_reward(stats)
-            reward += queue_reward
-            # print("queue: %f " % queue_reward, end='')
-        if "std_dev" in self.reward_model:
-            std_dev_reward = self._std_dev_reward(actions)
-            reward += std_dev_reward
-            # print("std_dev: %f " % std_dev_reward, end='')
-        # print("Total: %f" % reward)
-        return reward
+        for index, reward_func in enumerate(self.reward_funcs):
+            self.values[index] = reward_func(stats, deltas, actions)
+        return float(self.values.sum())
+
+    def get_rewards(self, stats, deltas, actions):
+        """ Compute the rewards of many steps at once. stats and deltas have
+            the shape (steps, stats, ports), actions (steps, hosts). Returns
+            the rewards and the (steps, components) values. """
+        values = np.zeros((len(stats), len(self.components)))
+        for index, reward_func in enumerate(self.reward_funcs):
+            values[:, index] = reward_func(stats, deltas, actions)
+        return values.sum(axis=1), values
+
+    def get_components(self):
+        """ Return the value of every component of the last reward. """
+        return dict(zip(self.components, self.values.tolist()))
 
-    def _adjust_reward(self, reward, queue_deltas):
-        if "olimit" in self.reward_model:
-            tmp_list = []
-            for port_stats in queue_deltas:
-                tmp_list.append(port_stats[self.stats_dict["olimit"]])
-            if any(tmp_list):
-                reward /= 4
-        if "drops" in self.reward_model:
-            tmp_list = []
-            for port_stats in queue_deltas:
-                tmp_list.append(port_stats[self.stats_dict["drops"]])
-            if any(tmp_list):
-                reward /= 4
+    # The components accept a single step or a batch of steps, the stat
+    # and port axes are always the last two.
+    def _adjust_reward(self, reward, deltas):
+        for stat in ("olimit", "drops"):
+            if stat in self.reward_model:
+                penalty = deltas[..., self.stats_dict[stat], :].any(axis=-1)
+                reward = np.where(penalty, reward / 4, reward)
         return reward
 
-    def _std_dev_reward(self, actions):
-        return -(np.std(actions) / float(self.max_bw))
+    def _std_dev_reward(self, stats, deltas, actions):
+        return -(np.std(actions, axis=-1) / float(self.max_bw))
 
-    def _action_reward(self, actions):
-        action_reward = []
-        for bw in actions:
-            action_reward.append(bw / float(self.max_bw))
-        return np.average(action_reward)
+    def _action_reward(self, stats, deltas, actions):
+        return np.mean(actions, axis=-1) / float(self.max_bw)
 
-    def _bw_reward(self, stats):
-        bw_reward = 0.0
-        weight = len(self.host_ports) / float(self.num_sw_ports)
-        for index, iface in enumerate(self.sw_ports):
-            if iface in self.host_ports:
-                bw = stats[self.stats_dict["bw_rx"]][index]
-                bw_reward += bw / float(self.max_bw)
-        return bw_reward
+    def _bw_reward(self, stats, deltas, actions):
+        bw = stats[..., self.stats_dict["bw_rx"], :]
+        bw_reward = bw[..., self.host_mask].sum(axis=-1) / float(self.max_bw)
+        return self._adjust_reward(bw_reward, deltas)
 
-    def _queue_reward(self, stats):
-        queue_reward = 0.0
-        weight = self.num_sw_ports / float(len(self.host_ports))
-        for index, _ in enumerate(self.sw_ports):
-            queue = stats[self.stats_dict["backlog"]][index]
-            queue_reward -= (float(queue) / float(self.max_queue))**2
-        return queue_reward * weight * 5
+    def _backlog_reward(self, stats, deltas, actions):
+        backlog = stats[..., self.stats_dict["backlog"], :]
+        # Reuse the buffer for single steps
+        out = self.queue_buf if backlog.ndim == 1 else None
+        queue = np.divide(backlog, float(self.max_queue), out=out)
+        return -np.einsum("...i,...i", queue, queue) * self.queue_weight
@@ -0,0 +1,638 @@
+from __future__ import print_function
+import re
+import heapq
+from collections import OrderedDict, deque
+import numpy as np
+
+from dc_gym.control.iroko_bw_control import BandwidthController
+from dc_gym.monitor.iroko_monitor import Collector, stats_rows
+from dc_gym.monitor.iroko_monitor import encode_sparse_flows
+from dc_gym.topos.topo_layout import BASE_CONF, DUMBBELL_CONF
+from dc_gym.topos.topo_layout import NONBLOCK_CONF, FATTREE_CONF
+from dc_gym.topos.topo_layout import DumbbellLayout, NonBlockingLayout
+from dc_gym.topos.topo_layout import FattreeLayout
+from iroko_traffic import parse_traffic_file
+
+# Size of a full packet in bytes, used to convert bytes to packet counters
+PKT_SIZE = 1500
+
+
+def natural_key(name):
+    """ Sort key that orders s2 before s10, like Mininet does. """
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r"(\d+)", name)]
+
+
+class SimTopo(object):
+    """ The node and port graph of a topology. Ports are numbered in the
+        order links are added, starting at 1 for switches and at 0 for
+        hosts, the same way Mininet numbers them. The nodes and links are
+        added by the layout of the topology. """
+
+    def __init__(self):
+        self.switches = []
+        self.ports = OrderedDict()
+
+    def addSwitch(self, name, **opts):
+        self.switches.append(name)
+        self.ports[name] = OrderedDict()
+        return name
+
+    def addHost(self, name, **opts):
+        self.ports[name] = OrderedDict()
+        return name
+
+    def isSwitch(self, node):
+        return node in self.switches
+
+    def _next_port(self, node):
+        base = 1 if self.isSwitch(node) else 0
+        return max(list(self.ports[node]) + [base - 1]) + 1
+
+    def addLink(self, node1, node2, **opts):
+        port1 = self._next_port(node1)
+        port2 = self._next_port(node2)
+        self.ports[node1][port1] = (node2, port2)
+        self.ports[node2][port2] = (node1, port1)
+
+    def get_iface(self, node, port):
+        return "%s-eth%d" % (node, port)
+
+
+# Switch ids only keep parallel Mininet networks apart, they are not needed
+# in a simulation
+class SimDumbbellTopo(DumbbellLayout, SimTopo):
+
+    def __init__(self, conf):
+        SimTopo.__init__(self)
+        DumbbellLayout.__init__(self, conf["num_hosts"], "")
+
+
+class SimNonBlockingTopo(NonBlockingLayout, SimTopo):
+
+    def __init__(self, conf):
+        SimTopo.__init__(self)
+        NonBlockingLayout.__init__(self, conf["num_hosts"], "")
+
+
+class SimFattreeTopo(FattreeLayout, SimTopo):
+
+    def __init__(self, conf):
+        SimTopo.__init__(self)
+        FattreeLayout.__init__(self, conf["fanout"], conf["density"], "")
+
+
+# The topology classes and their defaults
+SIM_TOPOS = {
+    "dumbbell": (SimDumbbellTopo, DUMBBELL_CONF),
+    "nonblock": (SimNonBlockingTopo, NONBLOCK_CONF),
+    "fattree": (SimFattreeTopo, FATTREE_CONF),
+}
+
+
+class SimTopoConfig(object):
+    """ Provides the TopoConfig interface of the Mininet topologies for a
+        simulated network of the same shape and naming. """
+
+    def __init__(self, name, conf={}):
+        if name not in SIM_TOPOS:
+            print("Fatal: Topology %s can not be simulated!" % name)
+            print("Supported topologies are: ")
+            for topo_name in SIM_TOPOS:
+                print(topo_name)
+            exit(1)
+        topo_class, topo_conf = SIM_TOPOS[name]
+        self.conf = dict(BASE_CONF)
+        self.conf.update(topo_conf)
+        self.conf.update(conf)
+        self.name = name
+        self.started = False
+        self.topo = topo_class(self.conf)
+        self.topo.create_nodes()
+        self.topo.create_links()
+        self.host_ips = self.topo.get_host_ips()
+        # Same switch interface to control interface mapping as Mininet
+        self.host_ctrl_map = OrderedDict()
+        self.host_sw_map = OrderedDict()
+        for index, host in enumerate(self.topo.hostlist):
+            for switch, port in self.topo.ports[host].values():
+                sw_iface = self.topo.get_iface(switch, port)
+                self.host_ctrl_map[sw_iface] = "c0-eth%d" % index
+                self.host_sw_map[sw_iface] = host
+
+    def start_network(self):
+        self.started = True
+
+    def stop_network(self):
+        self.started = False
+
+    def get_topo(self):
+        return self.topo
+
+    def get_traffic_pattern(self, index):
+        # start an all-to-all pattern if the list index is -1
+        if index == -1:
+            return "all"
+        return self.conf["traffic_files"][index]
+
+    def get_sw_ports(self):
+        sw_intfs = []
+        for switch in sorted(self.topo.switches, key=natural_key):
+            for port in sorted(self.topo.ports[switch]):
+                sw_intfs.append(self.topo.get_iface(switch, port))
+        return sw_intfs
+
+    def get_num_sw_ports(self):
+        return sum(len(self.topo.ports[sw]) for sw in self.topo.switches)
+
+    def get_host_ports(self):
+        return self.host_ctrl_map.keys()
+
+    def get_num_hosts(self):
+        return len(self.topo.hostlist)
+
+
+class FluidNetwork(object):
+    """ A fluid model of the switch queues of a topology. Traffic is a set
+        of flows between hosts, each host is limited by the rate of its tbf
+        and every switch port is a bfifo served at link capacity. Flows are
+        split evenly over all shortest paths, like ECMP. Time only advances
+        in ticks of the given length when advance is called. Once a tick
+        leaves the state of the network unchanged, every following tick up
+        to the next start or stop of a flow is the same, so these ticks
+        only add their counter increments.
+
+        The rate that reaches a port is the sending rate reduced by the
+        service ratio of the previous ports on the path in the last tick.
+        UDP flows always send their share of the host rate. TCP flows
+        increase their rate by one packet per round trip and halve it at
+        most once per round trip if a port on their path dropped. RED and
+        ECN marking are not modelled. """
+
+    def __init__(self, topo_conf, tick=0.005, base_rtt=0.0005):
+        self.tick = tick
+        self.base_rtt = base_rtt
+        # Time is counted in whole ticks, so it does not drift
+        self.ticks = 0
+        self.now = 0.0
+        self.transport = "tcp"
+        self.capacity = float(topo_conf.conf["max_capacity"])
+        self.max_queue = float(topo_conf.conf["max_queue"])
+        topo = topo_conf.get_topo()
+        self.topo = topo
+        self.sw_ports = topo_conf.get_sw_ports()
+        self.port_index = {}
+        for index, iface in enumerate(self.sw_ports):
+            self.port_index[iface] = index
+        self.host_index = {}
+        for index, host in enumerate(topo.hostlist):
+            self.host_index[host] = index
+        self.ip_index = {}
+        for host, ip in topo_conf.host_ips.items():
+            self.ip_index[ip] = self.host_index[host]
+        num_ports = len(self.sw_ports)
+        num_hosts = len(topo.hostlist)
+        self._init_links(topo, num_ports, num_hosts)
+        # Port state, the last entry is a pad port of unlimited capacity
+        self.backlog = np.zeros(num_ports)
+        # The counters of all ports and their increments in the last tick
+        self.counters = np.zeros((4, num_ports))
+        self.increments = np.zeros((4, num_ports))
+        self.olimit, self.drops, self.rx_bytes, self.tx_bytes = self.counters
+        self.stationary = False
+        self.ratio = np.ones(num_ports + 1)
+        self.delay = np.zeros(num_ports + 1)
+        self.dropping = np.zeros(num_ports + 1, dtype=bool)
+        # Every host starts at full rate like the tbf of the controllers
+        self.host_rates = np.full(num_hosts, self.capacity)
+        self.set_flows([])
+
+    def _init_links(self, topo, num_ports, num_hosts):
+        # For every port the peer port, or -1 if a host is behind it
+        self.peer_port = np.full(num_ports, -1, dtype=np.intp)
+        self.host_port = np.zeros(num_hosts, dtype=np.intp)
+        for iface, index in self.port_index.items():
+            switch, port = iface.rsplit("-eth", 1)
+            peer, peer_port = topo.ports[switch][int(port)]
+            if topo.isSwitch(peer):
+                self.peer_port[index] = self.port_index[
+                    topo.get_iface(peer, peer_port)]
+            else:
+                self.host_port[self.host_index[peer]] = index
+        self.host_peer = self.peer_port < 0
+
+    def _get_paths(self, src, dst):
+        """ Return all shortest paths from host src to host dst as lists
+            of the egress and ingress switch ports along the path. """
+        topo = self.topo
+        dist = {src: 0}
+        parents = {src: []}
+        queue = deque([src])
+        while queue:
+            node = queue.popleft()
+            if node == dst:
+                break
+            for port, (peer, peer_port) in topo.ports[node].items():
+                if peer != dst and not topo.isSwitch(peer):
+                    continue
+                if peer not in dist:
+                    dist[peer] = dist[node] + 1
+                    parents[peer] = []
+                    queue.append(peer)
+                if dist[peer] == dist[node] + 1:
+                    parents[peer].append((node, port, peer_port))
+        paths = []
+
+        def walk(node, egress, ingress):
+            if node == src:
+                paths.append((egress, ingress))
+                return
+            for parent, port, peer_port in parents.get(node, []):
+                hop_egress = egress
+                hop_ingress = ingress
+                if topo.isSwitch(parent):
+                    hop_egress = [self.port_index[
+                        topo.get_iface(parent, port)]] + egress
+                if topo.isSwitch(node):
+                    hop_ingress = [self.port_index[
+                        topo.get_iface(node, peer_port)]] + ingress
+                walk(parent, hop_egress, hop_ingress)
+        walk(dst, [], [])
+        return paths
+
+    def set_flows(self, flows):
+        """ Replace the traffic by flows, a list of tuples of source host,
+            destination host, start and stop time relative to now. """
+        num_ports = len(self.sw_ports)
+        sub_flow = []
+        sub_weight = []
+        sub_egress = []
+        sub_seen = []
+        for index, (src, dst, _, _) in enumerate(flows):
+            paths = self._get_paths(self.topo.hostlist[src],
+                                    self.topo.hostlist[dst])
+            for egress, ingress in paths:
+                sub_flow.append(index)
+                sub_weight.append(1.0 / len(paths))
+                sub_egress.append(egress)
+                sub_seen.append(egress + ingress)
+        num_flows = len(flows)
+        num_subs = len(sub_flow)
+        hops = max([len(egress) for egress in sub_egress] + [1])
+        # Egress ports of every subflow, padded with the pad port
+        self.sub_ports = np.full((num_subs, hops), num_ports, dtype=np.intp)
+        self.sub_seen = np.zeros((num_subs, num_ports), dtype=bool)
+        for index, egress in enumerate(sub_egress):
+            self.sub_ports[index, :len(egress)] = egress
+            self.sub_seen[index, sub_seen[index]] = True
+        self.sub_flow = np.array(sub_flow, dtype=np.intp)
+        self.sub_weight = np.array(sub_weight)
+        self.flow_src = np.array([f[0] for f in flows], dtype=np.intp)
+        self.flow_dst = np.array([f[1] for f in flows], dtype=np.intp)
+        # Source and destination host of every subflow as one-hot rows
+        num_hosts = len(self.host_rates)
+        self.sub_hosts = np.zeros((2, num_subs, num_hosts))
+        self.sub_hosts[0, np.arange(num_subs), self.flow_src[sub_flow]] = 1
+        self.sub_hosts[1, np.arange(num_subs), self.flow_dst[sub_flow]] = 1
+        self.flow_start = self.now + np.array([f[2] for f in flows])
+        self.flow_stop = self.now + np.array([f[3] for f in flows])
+        self.flow_rates = np.zeros(num_flows)
+        self.prev_rates = np.zeros(num_flows)
+        self.flow_cut = np.full(num_flows, -np.inf)
+        # Times at which the set of active flows changes
+        self.flow_events = np.unique(np.concatenate(
+            (self.flow_start, self.flow_stop)))
+        self.share = None
+        self.stationary = False
+        self.sub_rates = np.zeros(num_subs)
+        # Service ratio of the path up to each hop, nothing before the first
+        self.reach = np.ones((num_subs, hops))
+
+    def get_ip_index(self, ip):
+        return self.ip_index.get(ip)
+
+    def set_host_rates(self, rates, mask):
+        self.host_rates[mask] = rates[mask]
+        self.share = None
+        self.stationary = False
+
+    def _update_share(self):
+        # Split the rate of every host evenly over its active flows. This
+        # only changes with the host rates and at the next flow event.
+        active = (self.flow_start <= self.now) & (self.now < self.flow_stop)
+        num_hosts = len(self.host_rates)
+        num_active = np.bincount(self.flow_src[active], minlength=num_hosts)
+        self.share = self.host_rates[self.flow_src] / np.maximum(
+            num_active[self.flow_src], 1)
+        self.share[~active] = 0.0
+        self.share_tx = np.bincount(self.flow_src, weights=self.share,
+                                    minlength=num_hosts)
+        events = self.flow_events[self.flow_events > self.now]
+        self.share_until = events[0] if len(events) else np.inf
+
+    def _send(self):
+        if self.share is None or self.now >= self.share_until:
+            self._update_share()
+        if self.transport == "udp":
+            self.flow_rates = self.share
+            self.host_tx = self.share_tx
+        else:
+            self._update_tcp(self.share)
+            self.host_tx = np.bincount(
+                self.flow_src, weights=self.flow_rates,
+                minlength=len(self.host_rates))
+        return self.flow_rates[self.sub_flow] * self.sub_weight
+
+    def _update_tcp(self, share):
+        # Round trip time including the queueing delay of the path
+        np.multiply(self.backlog, 8 / self.capacity, out=self.delay[:-1])
+        sub_delay = self.delay[self.sub_ports].sum(axis=1)
+        rtt = self.base_rtt + np.bincount(
+            self.sub_flow, weights=sub_delay * self.sub_weight,
+            minlength=len(self.flow_rates))
+        pkt_rate = PKT_SIZE * 8 / rtt
+        if self.dropping.any():
+            dropped = np.bincount(
+                self.sub_flow,
+                weights=self.dropping[self.sub_ports].any(axis=1),
+                minlength=len(self.flow_rates)) > 0
+            cut = dropped & (self.now - self.flow_cut > rtt)
+            self.flow_rates[cut] /= 2
+            self.flow_cut[cut] = self.now
+            self.flow_rates[~cut] += pkt_rate[~cut] / rtt[~cut] * self.tick
+        else:
+            self.flow_rates += pkt_rate / rtt * self.tick
+        # Inactive flows have no share and stop sending
+        np.clip(self.flow_rates, pkt_rate, share, out=self.flow_rates)
+
+    def _step(self):
+        dt = self.tick
+        np.copyto(self.prev_rates, self.flow_rates)
+        sub_rates = self._send()
+        # Rate of every subflow at each hop after the ports before it
+        np.cumprod(self.ratio[self.sub_ports[:, :-1]], axis=1,
+                  out=self.reach[:, 1:])
+        reach = self.reach * sub_rates[:, None]
+        arrival = np.bincount(self.sub_ports.ravel(), weights=reach.ravel(),
+                              minlength=len(self.ratio))[:-1]
+        # bfifo served at link capacity, excess beyond the limit is dropped
+        served = np.minimum(self.capacity, arrival + self.backlog * 8 / dt)
+        backlog = self.backlog + (arrival - served) * dt / 8
+        dropped = np.maximum(backlog - self.max_queue, 0.0)
+        # Packets that found the port busy are counted as overlimits
+        busy = (self.backlog > 0) | (arrival > self.capacity)
+        olimit, drops, rx_bytes, tx_bytes = self.increments
+        np.multiply(busy * arrival, dt / 8 / PKT_SIZE, out=olimit)
+        np.divide(dropped, PKT_SIZE, out=drops)
+        backlog -= dropped
+        dropping = dropped > 0
+        ratio = np.ones(len(arrival))
+        np.divide(served, arrival, out=ratio, where=arrival > 0)
+        # The next tick repeats this one if no state changed
+        self.stationary = not (
+            (self.flow_rates != self.prev_rates).any() or
+            (backlog != self.backlog).any() or
+            (ratio != self.ratio[:-1]).any() or
+            (dropping != self.dropping[:-1]).any())
+        if self.transport != "udp" and dropping.any():
+            # TCP flows cut their rate depending on the time of the drop
+            self.stationary = False
+        self.dropping[:-1] = dropping
+        self.backlog = backlog
+        self.ratio[:-1] = ratio
+        rx = np.where(self.host_peer, 0.0, served[self.peer_port])
+        rx[self.host_port] = self.host_tx
+        np.multiply(rx, dt / 8, out=rx_bytes)
+        np.multiply(served, dt / 8, out=tx_bytes)
+        self.counters += self.increments
+        self.sub_rates = reach[:, -1] * self.ratio[self.sub_ports[:, -1]]
+        self.ticks += 1
+        self.now = self.ticks * dt
+
+    def _get_idle_ticks(self, ticks):
+        """ Return how many of the next ticks repeat the last one. """
+        if not self.stationary:
+            return 0
+        # The last tick ran at now - tick, stop before any flow event
+        events = self.flow_events[self.flow_events > self.now - self.tick]
+        if len(events):
+            ticks = min(ticks, int((events[0] - self.now) / self.tick) - 1)
+        return max(ticks, 0)
+
+    def advance(self, duration):
+        """ Run the model for duration seconds of simulated time. """
+        ticks = int(round(duration / self.tick))
+        while ticks > 0:
+            idle = self._get_idle_ticks(ticks)
+            if idle:
+                self.counters += self.increments * idle
+                self.ticks += idle
+                self.now = self.ticks * self.tick
+                ticks -= idle
+                continue
+            self._step()
+            ticks -= 1
+
+    def get_port_flows(self, flows):
+        """ Mark the source and destination hosts of every flow that
+            currently passes a port in flows of shape (ports, 2, hosts). """
+        seen = self.sub_seen * (self.sub_rates > 0)[:, None]
+        flows[:, 0] = np.dot(seen.T, self.sub_hosts[0]) > 0
+        flows[:, 1] = np.dot(seen.T, self.sub_hosts[1]) > 0
+
+
+class SimQueueCollector(Collector):
+
+    STATS = ["backlog", "olimit", "drops"]
+    INTERVAL = 0.05
+
+    def __init__(self, network, iface_list, shared_stats, stats_dict):
+        Collector.__init__(self, iface_list, shared_stats,
+                           stats_rows(stats_dict, self.STATS))
+        self.name = 'SimQueueCollector'
+        self.network = network
+        self.stats_dict = stats_dict
+
+    def _collect(self):
+        for stat in self.STATS:
+            self.sample[self.stats_dict[stat]] = getattr(self.network, stat)
+        self._publish()
+
+
+class SimBandwidthCollector(Collector):
+
+    STATS = ["bw_rx", "bw_tx"]
+    INTERVAL = 0.1
+
+    def __init__(self, network, iface_list, shared_stats, stats_dict):
+        Collector.__init__(self, iface_list, shared_stats,
+                           stats_rows(stats_dict, self.STATS))
+        self.name = 'SimBandwidthCollector'
+        self.network = network
+        self.stats_dict = stats_dict
+        self.prev_rx = network.rx_bytes.copy()
+        self.prev_tx = network.tx_bytes.copy()
+        self.prev_time = network.now
+
+    def _collect(self):
+        # Rates in bits per second from the counter deltas
+        elapsed = self.network.now - self.prev_time
+        if elapsed > 0:
+            self.sample[self.stats_dict["bw_rx"]] = (
+                self.network.rx_bytes - self.prev_rx) * 8 / elapsed
+            self.sample[self.stats_dict["bw_tx"]] = (
+                self.network.tx_bytes - self.prev_tx) * 8 / elapsed
+        np.copyto(self.prev_rx, self.network.rx_bytes)
+        np.copyto(self.prev_tx, self.network.tx_bytes)
+        self.prev_time = self.network.now
+        self._publish()
+
+
+class SimFlowCollector(Collector):
+
+    INTERVAL = 0.1
+
+    def __init__(self, network, iface_list, shared_flows, sparse=False):
+        Collector.__init__(self, iface_list, shared_flows)
+        self.name = 'SimFlowCollector'
+        self.network = network
+        self.sparse = sparse
+        self.flows = self.sample
+        if sparse:
+            self.flows = np.zeros(
+                (len(iface_list), 2, len(network.host_rates)))
+
+    def _collect(self):
+        self.network.get_port_flows(self.flows)
+        if self.sparse:
+            encode_sparse_flows(np.where(self.flows > 0, 1.0, -np.inf),
+                                self.sample)
+        self._publish()
+
+
+class SimEngine(object):
+    """ Drives the network model and samples the collectors at their
+        intervals in simulated time. Offers the interface of the
+        CollectorEngine, timeouts are in simulated seconds. """
+
+    def __init__(self, network, collectors):
+        self.name = 'SimEngine'
+        self.network = network
+        self.collectors = collectors
+        self.deadlines = []
+        for index, collector in enumerate(collectors):
+            heapq.heappush(self.deadlines, (network.now, index))
+
+    def start(self):
+        self._sample()
+
+    def _sample(self):
+        now = self.network.now
+        # Allow for the rounding error of the summed ticks
+        while self.deadlines and self.deadlines[0][0] <= now + 1e-9:
+            deadline, index = heapq.heappop(self.deadlines)
+            collector = self.collectors[index]
+            collector.taken = now
+            collector._collect()
+            deadline += collector.INTERVAL
+            heapq.heappush(self.deadlines, (max(deadline, now), index))
+
+    def advance(self, duration):
+        """ Advance simulated time by duration seconds and take every
+            sample that is due on the way. """
+        end = self.network.now + duration - 1e-9
+        while self.network.now < end:
+            # Run the model in one go up to the next sample that is due
+            until = end
+            if self.deadlines:
+                until = min(until, self.deadlines[0][0])
+            ticks = max(int(round((until - self.network.now) /
+                                  self.network.tick)), 1)
+            self.network.advance(ticks * self.network.tick)
+            self._sample()
+
+    def wait_for_samples(self, since, timeout):
+        """ Advance until every collector has published a sample taken
+            after the simulated time since. Returns False if this takes
+            longer than timeout simulated seconds. """
+        deadline = self.network.now + timeout
+        # A sample taken at since saw the network before the action
+        while any(c.stamp.value <= since for c in self.collectors):
+            if self.network.now >= deadline:
+                return False
+            self.advance(self.network.tick)
+        return True
+
+    def terminate(self):
+        self.deadlines = []
+
+
+class SimTrafficGen(object):
+    """ Loads traffic matrices into the network model. Every row of a
+        traffic file becomes a flow that runs from start_time to
+        stop_time after the traffic was started. """
+    SUPPORTED_TRANSPORT = ["tcp", "udp"]
+
+    def __init__(self, network, transport):
+        self.name = 'SimTrafficGen'
+        self.network = network
+        self.active = False
+        if transport.lower() not in self.SUPPORTED_TRANSPORT:
+            print("Fatal: Unknown transport protocol %s!" % transport.lower())
+            exit(1)
+        self.network.transport = transport.lower()
+
+    def traffic_is_active(self):
+        return self.active
+
+    def _load_flows(self, input_file):
+        num_hosts = len(self.network.host_rates)
+        if input_file.endswith("/all"):
+            return [(src, dst, 0.0, np.inf) for src in range(num_hosts)
+                    for dst in range(num_hosts) if src != dst]
+        traffic_pattern = parse_traffic_file(input_file)
+        if traffic_pattern is None:
+            exit(1)
+        flows = []
+        for row in traffic_pattern:
+            src = self.network.get_ip_index(row["src"])
+            dst = self.network.get_ip_index(row["dst"])
+            if src is None or dst is None:
+                print("Skipping flow %s -> %s with unknown hosts" %
+                      (row["src"], row["dst"]))
+                continue
+            flows.append((src, dst, float(row["start_time"]),
+                          float(row["stop_time"])))
+        return flows
+
+    def start_traffic(self, input_file, out_dir):
+        if not input_file:
+            return
+        print('*** Starting simulated traffic from:\n%s' % input_file)
+        self.network.set_flows(self._load_flows(input_file))
+        self.active = True
+
+    def stop_traffic(self, keep_controllers=False):
+        self.network.set_flows([])
+        self.active = False
+
+
+class SimBandwidthController(BandwidthController):
+    """ Applies the rates of the agent to the tbfs of the network model.
+        Updates always succeed and take no time. """
+
+    def __init__(self, host_ctrl_map, network):
+        self.host_ctrl_map = host_ctrl_map
+        self.network = network
+        self.retries = 0
+        self.init_broadcast_buffers(len(host_ctrl_map))
+
+    def destroy_transmissions_rings(self):
+        pass
+
+    def _broadcast_pending(self):
+        pending = self.status == self.REPLY_PENDING
+        self.network.set_host_rates(self.allocations.astype(float), pending)
+        self.status[pending] = self.REPLY_OK
+        self.rtts[pending] = 0.0
+        return 0
@@ -1,147 +1,293 @@
 from filelock import FileLock
 from multiprocessing import Array
-from ctypes import c_ulong, c_ubyte
+from ctypes import c_ulong, c_ubyte, c_ushort
 import numpy as np
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
 
 from dc_gym.monitor.iroko_monitor import BandwidthCollector
 from dc_gym.monitor.iroko_monitor import QueueCollector
 from dc_gym.monitor.iroko_monitor import FlowCollector
+from dc_gym.monitor.iroko_monitor import CollectorEngine
 from iroko_reward import RewardFunction
+from iroko_trace import TraceWriter
+from iroko_profile import StepProfiler
 
 
 def shmem_to_nparray(shmem_array, dtype):
     return np.frombuffer(shmem_array.get_obj(), dtype=dtype)
 
 
+def get_obs_shape(config, num_ports, num_hosts):
+    """ Return the shape of the observations of a state manager. Every
+        port has a column per stat of the state model, followed by the
+        flows if they are collected. With an obs_history of more than one,
+        the last observations are stacked. """
+    num_features = len(config["state_model"])
+    if config["collect_flows"] and config["flow_slots"]:
+        num_features += config["flow_slots"] * 2
+    elif config["collect_flows"]:
+        num_features += num_hosts * 2
+    obs_shape = (num_ports, num_features)
+    if config["obs_history"] > 1:
+        obs_shape = (config["obs_history"],) + obs_shape
+    return obs_shape
+
+
 class StateManager:
     STATS_DICT = {"backlog": 0, "olimit": 1,
                   "drops": 2, "bw_rx": 3, "bw_tx": 4}
-    __slots__ = ["num_ports", "deltas", "prev_stats",
-                 "stats_file", "data", "dopamin",
-                 "stats", "flow_stats", "procs"]
+    __slots__ = ["num_ports", "deltas", "prev_stats", "stats_keys",
+                 "collect_flows", "reward_model", "trace_dir", "trace",
+                 "dopamin", "stats", "flow_stats", "collectors", "engine",
+                 "readers", "obs_index", "obs", "obs_stats", "obs_flows",
+                 "snapshot", "obs_time", "profiler", "history_len",
+                 "history", "history_index", "flow_slots"]
 
     def __init__(self, topo_conf, config):
         sw_ports = topo_conf.get_sw_ports()
-        self.num_ports = topo_conf.get_num_sw_ports()
+        host_ports = topo_conf.get_host_ports()
+        self._init_state(config, sw_ports, host_ports,
+                         list(topo_conf.host_ips.values()),
+                         topo_conf.conf["max_queue"],
+                         topo_conf.conf["max_capacity"])
+        self._set_data_checkpoints(config, topo_conf, sw_ports, host_ports)
+
+    def _init_state(self, config, sw_ports, host_ports, host_ips,
+                    max_queue, max_capacity):
+        """ Set up the buffers, collectors, and reward function for the
+            given ports and hosts. State managers that do not run on a
+            topology call this instead of __init__. """
+        self.num_ports = len(sw_ports)
         self.stats_keys = config["state_model"]
         self.collect_flows = config["collect_flows"]
+        self.flow_slots = config["flow_slots"]
         self.reward_model = config["reward_model"]
+        self.history_len = config["obs_history"]
         self.deltas = None
         self.prev_stats = None
-        host_ports = topo_conf.get_host_ports()
-        self._init_stats_matrices(self.num_ports, len(topo_conf.host_ips))
-        self._spawn_collectors(sw_ports, host_ports, topo_conf.host_ips.values())
-        max_queue = topo_conf.conf["max_queue"]
-        max_capacity = topo_conf.conf["max_capacity"]
+        self.obs_time = 0.0
+        self.trace = None
+        # Times the phases of observe, replaced by the profiler of the env
+        self.profiler = StepProfiler([], enabled=False)
+        self._init_stats_matrices(self.num_ports, len(host_ips))
+        self._init_obs_buffers(self.num_ports, len(host_ips))
+        self._spawn_collectors(sw_ports, host_ports, host_ips)
+        self._init_readers(self.num_ports, len(host_ips))
         self.dopamin = RewardFunction(host_ports, sw_ports,
                                       self.reward_model,
                                       max_queue, max_capacity, self.STATS_DICT)
-        self._set_data_checkpoints(config["output_dir"])
+
+    def get_reward_components(self):
+        return self.dopamin.get_components()
 
     def flush_and_close(self):
         print("Writing collected data to disk")
-        with FileLock(self.stats_file.name + ".lock"):
+        with FileLock(self.trace_dir + ".lock"):
             try:
-                self.flush()
+                self.trace.close()
             except Exception as e:
-                print("Error flushing file %s" % self.stats_file.name, e)
-        self.stats_file.close()
+                print("Error flushing trace %s" % self.trace_dir, e)
 
     def terminate(self):
         self._terminate_collectors()
 
     def reset(self):
-        # self.flush()
-        pass
+        """ Start a new episode on the running collectors. The current
+            stats become the baseline of the next deltas. """
+        num_stats = len(self.STATS_DICT)
+        for collector, dst in self.readers:
+            collector.read(dst)
+        np.copyto(self.prev_stats, self.snapshot[:num_stats])
+        self.deltas.fill(0)
+        if self.history is not None:
+            self.history.fill(0)
+
+    def wait_for_drain(self, timeout):
+        """ Block until no switch queue holds any bytes. Returns False if
+            the queues did not drain within timeout seconds. """
+        deadline = self._now() + timeout
+        backlog = self.snapshot[self.STATS_DICT["backlog"]]
+        while True:
+            for collector, dst in self.readers:
+                collector.read(dst)
+            if not backlog.any():
+                return True
+            remaining = deadline - self._now()
+            if remaining <= 0:
+                return False
+            self.wait_for_samples(self._now(), remaining)
 
     def _init_stats_matrices(self, num_ports, num_hosts):
         self.stats = None
         self.flow_stats = None
-        self.procs = []
+        self.collectors = []
+        self.engine = None
         # Set up the shared stats matrix
         stats_arr_len = num_ports * len(self.STATS_DICT)
         mp_stats = Array(c_ulong, stats_arr_len)
         np_stats = shmem_to_nparray(mp_stats, np.int64)
         self.stats = np_stats.reshape((len(self.STATS_DICT), num_ports))
         # Set up the shared flow matrix
-        if (self.collect_flows):
+        if (self.collect_flows and self.flow_slots):
+            # Sparse: indices of up to flow_slots active hosts per port
+            flow_arr_len = num_ports * self.flow_slots * 2
+            mp_flows = Array(c_ushort, flow_arr_len)
+            np_flows = shmem_to_nparray(mp_flows, np.uint16)
+            self.flow_stats = np_flows.reshape(
+                (num_ports, 2, self.flow_slots))
+        elif (self.collect_flows):
             flow_arr_len = num_ports * num_hosts * 2
             mp_flows = Array(c_ubyte, flow_arr_len)
             np_flows = shmem_to_nparray(mp_flows, np.uint8)
             self.flow_stats = np_flows.reshape((num_ports, 2, num_hosts))
         # Save the initialized stats matrix to compute deltas
         self.prev_stats = self.stats.copy()
-        self.deltas = np.zeros(shape=(len(self.STATS_DICT), num_ports))
+        # The snapshot holds the current stats followed by their deltas
+        self.snapshot = np.zeros(
+            shape=(2 * len(self.STATS_DICT), num_ports), dtype=np.int64)
+        self.deltas = self.snapshot[len(self.STATS_DICT):]
+
+    def _init_obs_buffers(self, num_ports, num_hosts):
+        # Translate the state model into row indices of the snapshot once,
+        # "d_" keys point to the delta half of the snapshot
+        num_stats = len(self.STATS_DICT)
+        obs_index = []
+        for key in self.stats_keys:
+            if key.startswith("d_"):
+                obs_index.append(num_stats + self.STATS_DICT[key[2:]])
+            else:
+                obs_index.append(self.STATS_DICT[key])
+        self.obs_index = np.array(obs_index, dtype=np.intp)
+        num_features = len(self.stats_keys)
+        if self.collect_flows:
+            num_features += self.flow_stats.shape[2] * 2
+        self.obs = np.zeros(shape=(num_ports, num_features), dtype=np.int64)
+        # Transposed view so the stat rows can be gathered in place
+        self.obs_stats = self.obs[:, :len(self.stats_keys)].T
+        self.obs_flows = None
+        if self.collect_flows:
+            self.obs_flows = self.obs[:, len(self.stats_keys):]
+        # Every observation is stored twice in a ring of 2 * history_len
+        # frames, so the last history_len frames are always a contiguous
+        # slice in chronological order.
+        self.history = None
+        self.history_index = 0
+        if self.history_len > 1:
+            self.history = np.zeros(
+                shape=(2 * self.history_len,) + self.obs.shape,
+                dtype=np.int64)
 
     def _spawn_collectors(self, sw_ports, host_ports, host_ips):
-        # Launch an asynchronous queue collector
-        proc = QueueCollector(sw_ports, self.stats, self.STATS_DICT)
-        proc.start()
-        self.procs.append(proc)
-        # Launch an asynchronous bandwidth collector
-        proc = BandwidthCollector(host_ports, self.stats, self.STATS_DICT)
-        proc.start()
-        self.procs.append(proc)
-        # Launch an asynchronous flow collector
+        # Queue and bandwidth collectors are always active
+        self.collectors.append(
+            QueueCollector(sw_ports, self.stats, self.STATS_DICT))
+        self.collectors.append(
+            BandwidthCollector(sw_ports, self.stats, self.STATS_DICT))
         if (self.collect_flows):
-            proc = FlowCollector(sw_ports, host_ips, self.flow_stats)
-            proc.start()
-            self.procs.append(proc)
-
-    def _set_data_checkpoints(self, data_dir):
-        self.data = {}
-        # define file name
-        runtime_name = "%s/runtime_statistics.npy" % (data_dir)
-        self.stats_file = open(runtime_name, 'wb+')
-        self.data["reward"] = []
-        self.data["actions"] = []
-        self.data["stats"] = []
+            self.collectors.append(
+                FlowCollector(sw_ports, host_ips, self.flow_stats,
+                              sparse=self.flow_slots > 0))
+        # Launch a single asynchronous process that samples all collectors
+        self.engine = CollectorEngine(self.collectors)
+        self.engine.start()
+
+    def _init_readers(self, num_ports, num_hosts):
+        # Every collector publishes into the snapshot or the flow columns
+        num_stats = len(self.STATS_DICT)
+        self.readers = []
+        for collector in self.collectors:
+            if self.collect_flows and collector.shared is self.flow_stats:
+                dst = self.obs_flows.reshape(self.flow_stats.shape)
+            else:
+                dst = self.snapshot[:num_stats]
+            self.readers.append((collector, dst))
+
+    def _set_data_checkpoints(self, config, topo_conf,
+                              sw_ports, host_ports):
+        # Samples are streamed to disk in chunks of trace_chunk steps.
+        # Every stat is stored as its own column of shape (steps, ports).
+        self.trace_dir = "%s/runtime_statistics" % (config["output_dir"])
+        num_hosts = len(topo_conf.host_ips)
+        num_components = len(self.dopamin.components)
+        columns = [("reward", np.float64, ()),
+                   ("reward_parts", np.float64, (num_components,)),
+                   ("actions", np.float64, (num_hosts,))]
+        for stat in sorted(self.STATS_DICT, key=self.STATS_DICT.get):
+            columns.append((stat, np.int64, (self.num_ports,)))
+        meta = {"stats_dict": self.STATS_DICT,
+                "sw_ports": list(sw_ports),
+                "host_ports": list(host_ports),
+                "max_queue": topo_conf.conf["max_queue"],
+                "max_capacity": topo_conf.conf["max_capacity"],
+                "state_model": self.stats_keys,
+                "reward_model": self.reward_model,
+                "reward_components": self.dopamin.components,
+                "sample_delta": config["sample_delta"]}
+        self.trace = TraceWriter(self.trace_dir, columns,
+                                 config["trace_chunk"], meta)
 
     def _terminate_collectors(self):
-        for proc in self.procs:
-            if proc is not None:
-                proc.terminate()
-
-    def _compute_deltas(self, num_ports, stats_prev, stats_now):
-        for iface_index in range(num_ports):
-            for delta_index, stat in enumerate(self.STATS_DICT.keys()):
-                stat_index = self.STATS_DICT[stat]
-                prev = stats_prev[stat_index][iface_index]
-                now = stats_now[stat_index][iface_index]
-                self.deltas[delta_index][iface_index] = now - prev
+        if self.engine is not None:
+            self.engine.terminate()
+
+    def wait_for_samples(self, since, timeout):
+        """ Block until all collectors sampled after the monotonic time since.
+            Returns False if they did not do so within timeout seconds. """
+        return self.engine.wait_for_samples(since, timeout)
+
+    def _now(self):
+        # The clock of the sample time stamps
+        return monotonic()
+
+    def get_obs_age(self):
+        # Age of the oldest sample that went into the last observation
+        return self._now() - self.obs_time
+
+    def _compute_deltas(self, stats_prev, stats_now):
+        np.subtract(stats_now, stats_prev, out=self.deltas)
 
     def observe(self, curr_action, do_sample):
-        obs = []
+        num_stats = len(self.STATS_DICT)
+        stats = self.snapshot[:num_stats]
+        # Copy one coherent generation of every collector
+        obs_time = float("inf")
+        for collector, dst in self.readers:
+            obs_time = min(obs_time, collector.read(dst))
+        self.obs_time = obs_time
+        self.profiler.toc("read")
         # retrieve the current deltas before updating total values
-        self._compute_deltas(self.num_ports, self.prev_stats, self.stats)
-        self.prev_stats = self.stats.copy()
-        # Create the data matrix for the agent based on the collected stats
-        for index in range(self.num_ports):
-            state = []
-            for key in self.stats_keys:
-                if (key.startswith("d_")):
-                    state.append(
-                        int(self.deltas[self.STATS_DICT[key[2:]]][index]))
-                else:
-                    state.append(int(self.stats[self.STATS_DICT[key]][index]))
-            if self.collect_flows:
-                state.extend(self.flow_stats[index])
-            # print("State %d: %s " % (index, state))
-            obs.append(np.array(state))
+        self._compute_deltas(self.prev_stats, stats)
+        np.copyto(self.prev_stats, stats)
+        # Gather the data matrix for the agent from the snapshot
+        np.take(self.snapshot, self.obs_index, axis=0,
+                out=self.obs_stats, mode="clip")
+        obs = self._push_history()
+        self.profiler.toc("state")
         # Compute the reward
-        reward = self.dopamin.get_reward(
-            self.stats, self.deltas, curr_action)
+        reward = self.dopamin.get_reward(stats, self.deltas, curr_action)
+        self.profiler.toc("reward")
 
         if (do_sample):
             # Save collected data
-            self.data["stats"].append(self.stats.copy())
-            self.data["reward"].append(reward)
-            self.data["actions"].append(curr_action)
-        return np.array(obs), reward
+            self.trace.append(reward, self.dopamin.values, curr_action,
+                              *stats)
+            self.profiler.toc("trace")
+        return obs, reward
+
+    def _push_history(self):
+        """ Add the current observation to the history and return the last
+            history_len observations, oldest first. """
+        if self.history is None:
+            return self.obs
+        index = self.history_index
+        self.history[index] = self.obs
+        self.history[index + self.history_len] = self.obs
+        self.history_index = (index + 1) % self.history_len
+        return self.history[index + 1:index + 1 + self.history_len]
 
     def flush(self):
         print("Saving statistics...")
-        np.save(self.stats_file, np.array(self.data))
-        self.stats_file.flush()
-        for key in self.data.keys():
-            del self.data[key][:]
+        self.trace.flush()
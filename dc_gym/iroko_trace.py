@@ -0,0 +1,204 @@
+from __future__ import print_function
+import argparse
+import json
+import os
+import numpy as np
+
+# Fixed size of the .npy header so it can be rewritten in place
+HEADER_SIZE = 256
+# Name of the JSON file describing the columns of a trace
+TRACE_HEADER = "header.json"
+TRACE_VERSION = 1
+# Row layout of the stats matrix in legacy runtime_statistics.npy files
+LEGACY_STATS_DICT = {"backlog": 0, "olimit": 1,
+                     "drops": 2, "bw_rx": 3, "bw_tx": 4}
+
+
+def _write_npy_header(npy_file, dtype, shape):
+    """ Write a version 1.0 .npy header padded to HEADER_SIZE bytes. """
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+              "fortran_order": False, "shape": tuple(shape)}
+    header = repr(header).encode("latin1")
+    preamble = np.lib.format.magic(1, 0)
+    header_len = HEADER_SIZE - len(preamble) - 2
+    if len(header) + 1 > header_len:
+        raise ValueError("Header of %s is too long!" % npy_file.name)
+    header = header.ljust(header_len - 1) + b"\n"
+    npy_file.seek(0)
+    npy_file.write(preamble)
+    npy_file.write(np.array(header_len, dtype="<u2").tobytes())
+    npy_file.write(header)
+
+
+class TraceColumn(object):
+    """ A growing .npy file with a preallocated buffer of one chunk. """
+
+    def __init__(self, path, dtype, shape, chunk_size):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.buf = np.zeros(shape=(chunk_size,) + self.shape,
+                            dtype=self.dtype)
+        self.rows = 0
+        self.npy_file = open(path, "wb+")
+        _write_npy_header(self.npy_file, self.dtype, (0,) + self.shape)
+        self.npy_file.flush()
+
+    def flush(self, num_rows):
+        if num_rows == 0:
+            return
+        # Append the data first, only then announce it in the header
+        self.npy_file.seek(0, os.SEEK_END)
+        self.npy_file.write(self.buf[:num_rows].tobytes())
+        self.rows += num_rows
+        _write_npy_header(self.npy_file, self.dtype,
+                          (self.rows,) + self.shape)
+        self.npy_file.flush()
+
+    def close(self):
+        self.npy_file.close()
+
+
+def _write_json(path, data):
+    # Write to a temporary file first so readers never see partial JSON
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as json_file:
+        json.dump(data, json_file, indent=2)
+    os.rename(tmp_path, path)
+
+
+class TraceWriter(object):
+    """ Append-only trace of per-step values. Each column is buffered in
+        memory for chunk_size steps and then appended to its own .npy file
+        in out_dir. The files are valid at any point in time and can be
+        opened with np.load(..., mmap_mode="r"). If the process dies, at
+        most the current chunk is lost. A JSON header lists the columns
+        together with the metadata of the run. """
+
+    def __init__(self, out_dir, columns, chunk_size=1000, meta=None):
+        if meta is None:
+            meta = {}
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.index = 0
+        self.columns = []
+        self.header = {"version": TRACE_VERSION, "complete": False,
+                       "chunk_size": chunk_size, "columns": {},
+                       "meta": meta}
+        for name, dtype, shape in columns:
+            path = "%s/%s.npy" % (out_dir, name)
+            column = TraceColumn(path, dtype, shape, chunk_size)
+            self.columns.append(column)
+            self.header["columns"][name] = {
+                "dtype": column.dtype.str, "shape": list(column.shape)}
+        _write_json("%s/%s" % (out_dir, TRACE_HEADER), self.header)
+
+    def append(self, *values):
+        """ Append one step, values are given in the order of columns. """
+        for column, value in zip(self.columns, values):
+            column.buf[self.index] = value
+        self.index += 1
+        if self.index == self.chunk_size:
+            self.flush()
+
+    def extend(self, *values):
+        """ Append many steps at once, values are arrays of steps given in
+            the order of columns. """
+        num_rows = len(values[0])
+        start = 0
+        while start < num_rows:
+            rows = min(self.chunk_size - self.index, num_rows - start)
+            for column, value in zip(self.columns, values):
+                column.buf[self.index:self.index + rows] = \
+                    value[start:start + rows]
+            self.index += rows
+            start += rows
+            if self.index == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        for column in self.columns:
+            column.flush(self.index)
+        self.index = 0
+
+    def close(self):
+        self.flush()
+        for column in self.columns:
+            column.close()
+        self.header["complete"] = True
+        _write_json("%s/%s" % (self.out_dir, TRACE_HEADER), self.header)
+
+
+def load_header(trace_dir):
+    with open("%s/%s" % (trace_dir, TRACE_HEADER), "r") as json_file:
+        return json.load(json_file)
+
+
+def load_trace(trace_dir, columns=None):
+    """ Memory-map the requested columns of a trace, by default all of them.
+        Columns are cut to the same number of rows in case the writer died
+        in the middle of a flush. """
+    header = load_header(trace_dir)
+    if columns is None:
+        columns = list(header["columns"].keys())
+    trace = {}
+    for name in columns:
+        if name not in header["columns"]:
+            raise KeyError("Trace %s has no column %s" % (trace_dir, name))
+        path = "%s/%s.npy" % (trace_dir, name)
+        trace[name] = np.load(path, mmap_mode="r")
+    num_rows = min([len(column) for column in trace.values()] or [0])
+    for name in trace:
+        trace[name] = trace[name][:num_rows]
+    return trace
+
+
+def _load_legacy_file(stats_file):
+    # Legacy files contain one or more pickled dicts of lists
+    data = {"stats": [], "reward": [], "actions": []}
+    with open(stats_file, "rb") as npy_file:
+        file_size = os.fstat(npy_file.fileno()).st_size
+        while npy_file.tell() < file_size:
+            item = np.load(npy_file, allow_pickle=True,
+                           encoding="latin1").item()
+            for key in data:
+                data[key].extend(item[key])
+    return data
+
+
+def convert_legacy_stats(stats_file, trace_dir=None, chunk_size=1000):
+    """ Convert a pickled runtime_statistics.npy file into a trace. """
+    if trace_dir is None:
+        trace_dir = os.path.splitext(stats_file)[0]
+    data = _load_legacy_file(stats_file)
+    num_steps = len(data["reward"])
+    if num_steps == 0:
+        raise ValueError("File %s contains no samples" % stats_file)
+    stats = np.asarray(data["stats"], dtype=np.int64)
+    actions = np.asarray(data["actions"], dtype=np.float64)
+    reward = np.asarray(data["reward"], dtype=np.float64)
+    stat_names = sorted(LEGACY_STATS_DICT, key=LEGACY_STATS_DICT.get)
+    columns = [("reward", np.float64, ()),
+               ("actions", np.float64, actions.shape[1:])]
+    for name in stat_names:
+        columns.append((name, np.int64, stats.shape[2:]))
+    meta = {"stats_dict": LEGACY_STATS_DICT, "source": stats_file}
+    trace = TraceWriter(trace_dir, columns, chunk_size, meta)
+    for step in range(num_steps):
+        trace.append(reward[step], actions[step], *stats[step])
+    trace.close()
+    return trace_dir
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(
+        description="Convert pickled runtime_statistics.npy files into "
+                    "columnar traces.")
+    PARSER.add_argument('stats_files', nargs='+',
+                        help='Legacy runtime_statistics.npy files.')
+    ARGS = PARSER.parse_args()
+    for legacy_file in ARGS.stats_files:
+        print("Converting %s..." % legacy_file)
+        print("Wrote trace %s" % convert_legacy_stats(legacy_file))
@@ -43,9 +43,13 @@ def kill_processes(procs):
 class TrafficGen():
     SUPPORTED_TRANSPORT = ["tcp", "udp"]
 
-    def __init__(self, topo_conf, transport):
+    def __init__(self, topo_conf, transport, node_ctrl=True):
         self.name = 'TrafficGen'
         self.topo_conf = topo_conf
+        # Hosts only need a controller if rates arrive over the network
+        self.node_ctrl = node_ctrl
+        # Controllers outlive the traffic if the environment is soft reset
+        self.ctrl_procs = []
         self.procs = []
         self._set_t_type(transport)
 
@@ -61,7 +65,7 @@ class TrafficGen():
 
     def traffic_is_active(self):
         ''' Return false if any of the processes has terminated '''
-        for proc in self.procs:
+        for proc in self.procs + self.ctrl_procs:
             poll = proc.poll()
             if poll is not None:
                 return False
@@ -91,7 +95,7 @@ class TrafficGen():
             ctrl_cmd = "%s -n %s -c %s &" % (traffic_ctrl,
                                              iface_net, ifaces_ctrl)
             c_proc = start_process(ctrl_cmd, host, out_file)
-            self.procs.append(c_proc)
+            self.ctrl_procs.append(c_proc)
 
     def _start_client(self, traffic_gen, host, out_dir, dst_hosts):
         if not dst_hosts:
@@ -175,16 +179,20 @@ class TrafficGen():
         # Suppress ouput of the traffic generators
         traffic_gen += " -silent "
         self._start_servers(hosts, traffic_gen, out_dir)
-        self._start_controllers(hosts, out_dir)
+        if self.node_ctrl and not self.ctrl_procs:
+            self._start_controllers(hosts, out_dir)
         self._start_generators(hosts, input_file, traffic_gen, out_dir)
         # self._start_pkt_capture(out_dir)
         # wait for load controllers to initialize
         sleep(0.5)
 
-    def stop_traffic(self):
+    def stop_traffic(self, keep_controllers=False):
         print('')
         if self.traffic_is_active:
             print('*** Stopping traffic processes')
             kill_processes(self.procs)
             del self.procs[:]
+        if not keep_controllers:
+            kill_processes(self.ctrl_procs)
+            del self.ctrl_procs[:]
         sys.stdout.flush()
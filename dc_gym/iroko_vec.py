@@ -0,0 +1,179 @@
+import os
+import copy
+import atexit
+import tempfile
+import multiprocessing
+import numpy as np
+
+from dc_gym.factories import EnvFactory
+
+# Shared buffers live in memory if the system provides a tmpfs
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _get_layout(num_envs, obs_space, action_space):
+    """ Return the name, dtype, and shape of every shared buffer together
+        with their total size in bytes. """
+    layout = [("obs", obs_space.dtype, (num_envs,) + obs_space.shape),
+              ("actions", action_space.dtype,
+               (num_envs,) + action_space.shape),
+              ("rewards", np.dtype(np.float64), (num_envs,)),
+              ("dones", np.dtype(np.bool_), (num_envs,))]
+    size = sum(dtype.itemsize * int(np.prod(shape))
+               for _, dtype, shape in layout)
+    return layout, size
+
+
+def _map_buffers(path, num_envs, obs_space, action_space):
+    """ Map the observations, actions, rewards, and done flags of all
+        environments from one shared file. """
+    layout, size = _get_layout(num_envs, obs_space, action_space)
+    shared = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+    buffers = {}
+    offset = 0
+    for name, dtype, shape in layout:
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        buffers[name] = shared[offset:offset + nbytes].view(
+            dtype).reshape(shape)
+        offset += nbytes
+    return buffers
+
+
+def _worker(remote, config, index, num_envs):
+    env = EnvFactory.create(config)
+    remote.send((env.observation_space, env.action_space))
+    buffers = _map_buffers(remote.recv(), num_envs, env.observation_space,
+                           env.action_space)
+    obs = buffers["obs"][index]
+    action = buffers["actions"][index]
+    remote.send(None)
+    try:
+        while True:
+            cmd = remote.recv()
+            if cmd == "step":
+                step_obs, reward, done, info = env.step(action)
+                if done:
+                    step_obs = env.reset()
+                obs[:] = step_obs
+                buffers["rewards"][index] = reward
+                buffers["dones"][index] = done
+                remote.send(info)
+            elif cmd == "reset":
+                obs[:] = env.reset()
+                remote.send(None)
+            elif cmd == "close":
+                break
+    except KeyboardInterrupt:
+        print("VecEnv worker %d: Caught Interrupt! Exiting..." % index)
+    finally:
+        env.kill_env()
+        remote.close()
+
+
+class VecEnv(object):
+    """ Steps num_envs environments in their own processes. Observations,
+        actions, rewards, and done flags are exchanged through one shared
+        memory file, only the info dicts are sent over pipes. The arrays
+        returned by reset and step_wait are the shared buffers and are
+        overwritten by the next call. Environments that are done are reset
+        automatically. Every environment writes to its own output folder
+        and gets unique switch ids. """
+    # Seconds a worker may take to tear down its environment
+    CLOSE_TIMEOUT = 60
+
+    def __init__(self, config, num_envs):
+        self.num_envs = num_envs
+        self.waiting = False
+        self.closed = False
+        self.remotes = []
+        self.procs = []
+        for index in range(num_envs):
+            env_config = copy.deepcopy(config)
+            env_config.setdefault("topo_conf", {})["parallel_envs"] = True
+            env_config["output_dir"] = "%s/env%d" % (
+                config.get("output_dir", "../results/"), index)
+            remote, worker_remote = multiprocessing.Pipe()
+            proc = multiprocessing.Process(
+                target=_worker, args=(worker_remote, env_config, index,
+                                      num_envs))
+            # Environments start collector processes of their own, which
+            # daemonic workers are not allowed to. close stops the workers.
+            proc.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.procs.append(proc)
+        spaces = [remote.recv() for remote in self.remotes]
+        self.observation_space, self.action_space = spaces[0]
+        self._init_buffers()
+        atexit.register(self.close)
+
+    def _init_buffers(self):
+        _, size = _get_layout(self.num_envs, self.observation_space,
+                              self.action_space)
+        fd, path = tempfile.mkstemp(prefix="iroko_vec_", dir=SHM_DIR)
+        # Size the file before anybody maps it
+        os.ftruncate(fd, size)
+        os.close(fd)
+        buffers = _map_buffers(path, self.num_envs, self.observation_space,
+                               self.action_space)
+        for remote in self.remotes:
+            remote.send(path)
+        for remote in self.remotes:
+            remote.recv()
+        # All workers mapped the file, it disappears once they unmap it
+        os.remove(path)
+        self.obs = buffers["obs"]
+        self.actions = buffers["actions"]
+        self.rewards = buffers["rewards"]
+        self.dones = buffers["dones"]
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send("reset")
+        for remote in self.remotes:
+            remote.recv()
+        return self.obs
+
+    def step_async(self, actions):
+        """ Hand the actions of shape (num_envs, action_dim) to the workers
+            and return immediately. """
+        np.copyto(self.actions, actions, casting="unsafe")
+        for remote in self.remotes:
+            remote.send("step")
+        self.waiting = True
+
+    def step_wait(self):
+        """ Wait for all workers to finish their step. Returns the shared
+            observations, rewards, done flags, and a list of info dicts. """
+        infos = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        return self.obs, self.rewards, self.dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            try:
+                self.step_wait()
+            except EOFError:
+                pass
+        for remote in self.remotes:
+            try:
+                remote.send("close")
+            except (IOError, OSError):
+                # The worker is already gone
+                pass
+        for proc in self.procs:
+            proc.join(self.CLOSE_TIMEOUT)
+            if proc.is_alive():
+                print("VecEnv: Worker %d did not exit, terminating..." %
+                      proc.pid)
+                proc.terminate()
+                proc.join()
+        for remote in self.remotes:
+            remote.close()
+        self.closed = True
@@ -1,21 +1,80 @@
 import subprocess
-import re
 import multiprocessing
 import ctypes
+import heapq
+import mmap
 import os
+import socket
+import struct
 import time
+import numpy as np
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+from dc_gym.control.python_bpf_filter import attach_ipv4_filter
 
 MAX_CAPACITY = 10e6   # Max capacity of link
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
-class Collector(multiprocessing.Process):
-
-    def __init__(self, iface_list):
-        multiprocessing.Process.__init__(self)
+def stats_rows(stats_dict, keys):
+    """ Return the rows of the given stats as a slice of the stats matrix.
+        Collectors own a contiguous block of rows. """
+    rows = sorted(stats_dict[key] for key in keys)
+    if rows != list(range(rows[0], rows[-1] + 1)):
+        raise ValueError("Stats %s are not contiguous!" % keys)
+    return slice(rows[0], rows[-1] + 1)
+
+
+def encode_sparse_flows(priority, out):
+    """ Encode the active hosts of every port and direction as a sorted
+        list of host indices in out of shape (ports, 2, slots). priority
+        has the shape (ports, 2, hosts) and is -inf for inactive hosts.
+        Indices start at 1 and 0 marks an empty slot. If more hosts are
+        active than there are slots, the ones with the highest priority
+        are kept. """
+    num_hosts = priority.shape[-1]
+    num_slots = min(out.shape[-1], num_hosts)
+    if num_slots < num_hosts:
+        top = np.argpartition(-priority, num_slots - 1, axis=-1)
+        top = top[..., :num_slots]
+    else:
+        top = np.broadcast_to(np.arange(num_hosts), priority.shape)
+    active = np.take_along_axis(priority, top, axis=-1) > -np.inf
+    # Sort the active hosts to the front, empty slots to the back
+    codes = np.where(active, top + 1, num_hosts + 1)
+    codes.sort(axis=-1)
+    codes[codes > num_hosts] = 0
+    out[..., :num_slots] = codes
+    out[..., num_slots:] = 0
+
+
+class Collector(object):
+    """ A source of stats sampled by the CollectorEngine. Every call of
+        _collect takes one sample and publishes it. """
+
+    # Sampling period in seconds
+    INTERVAL = 0.1
+    # Seconds a reader waits for a publish to finish before giving up
+    READ_TIMEOUT = 1.0
+
+    def __init__(self, iface_list, shared, rows=slice(None)):
         self.name = 'Collector'
         self.iface_list = iface_list
-        self.kill = multiprocessing.Event()
+        # Inactive sources are no longer scheduled or waited for
+        self.active = multiprocessing.RawValue(ctypes.c_bool, True)
+        # The shared matrix and the part of it this collector publishes
+        self.shared = shared
+        self.rows = rows
+        # Samples are assembled privately and published in one go
+        self.sample = np.zeros(shape=shared.shape, dtype=shared.dtype)
+        # Sequence lock of the published sample, odd while writing
+        self.seq = multiprocessing.RawValue(ctypes.c_ulong, 0)
+        # Monotonic time at which the published sample was taken
+        self.taken = 0.0
+        self.stamp = multiprocessing.RawValue(ctypes.c_double, 0.0)
 
     def set_interfaces(self):
         cmd = "sudo ovs-vsctl list-br | xargs -L1 sudo ovs-vsctl list-ports"
@@ -26,179 +85,389 @@ class Collector(multiprocessing.Process):
                 iface_list_temp.append(row)
         self.iface_list = iface_list_temp
 
-    def run(self):
-        while not self.kill.is_set():
-            try:
-                self._collect()
-            except KeyboardInterrupt:
-                print("%s: Caught Interrupt! Exiting..." % self.name)
-                self.kill.set()
-        self._clean()
+    def _setup(self):
+        pass
 
     def _collect(self):
         raise NotImplementedError("Method _collect not implemented!")
 
+    def _clean(self):
+        pass
+
+    def _publish(self):
+        """ Publish the private sample as one complete generation. """
+        self.seq.value += 1
+        self.shared[self.rows] = self.sample[self.rows]
+        self.stamp.value = self.taken
+        self.seq.value += 1
+
+    def read(self, dst):
+        """ Copy the latest complete generation into dst without blocking
+            the writer. Retries if the copy overlapped with a publish.
+            Returns the time at which the copied sample was taken. Raises
+            a RuntimeError if the writer does not finish its publish within
+            READ_TIMEOUT seconds, e.g., because it died in the middle. """
+        deadline = None
+        while True:
+            seq = self.seq.value
+            if not seq & 1:
+                dst[self.rows] = self.shared[self.rows]
+                stamp = self.stamp.value
+                if self.seq.value == seq:
+                    return stamp
+            if deadline is None:
+                deadline = monotonic() + self.READ_TIMEOUT
+            elif monotonic() > deadline:
+                raise RuntimeError("%s: Sample was not published within "
+                                   "%.1f seconds!" %
+                                   (self.name, self.READ_TIMEOUT))
+            # Let the writer finish its publish
+            time.sleep(0)
+
+
+class CollectorEngine(multiprocessing.Process):
+    """ Samples all collectors from a single process. Each collector is
+        due at fixed multiples of its own interval. The engine sleeps until
+        the earliest deadline, so the idle cost does not grow with the
+        number of collectors. Samples that are missed because a collector
+        overran are skipped instead of being taken in a burst. """
+    # Seconds the engine gets to finish its current sample and clean up
+    STOP_TIMEOUT = 2.0
+
+    def __init__(self, collectors):
+        multiprocessing.Process.__init__(self)
+        self.name = 'CollectorEngine'
+        self.collectors = collectors
+        self.kill = multiprocessing.Event()
+        # Set whenever any collector has published a new sample
+        self.published = multiprocessing.Event()
+
+    def _schedule(self):
+        deadlines = []
+        now = monotonic()
+        for index, collector in enumerate(self.collectors):
+            collector._setup()
+            if collector.active.value:
+                heapq.heappush(deadlines, (now, index))
+        return deadlines
+
+    def _next_deadline(self, deadline, interval):
+        deadline += interval
+        now = monotonic()
+        if deadline < now:
+            missed = int((now - deadline) / interval) + 1
+            deadline += missed * interval
+        return deadline
+
+    def run(self):
+        deadlines = self._schedule()
+        try:
+            while deadlines and not self.kill.is_set():
+                deadline, index = heapq.heappop(deadlines)
+                delay = deadline - monotonic()
+                if delay > 0 and self.kill.wait(delay):
+                    break
+                collector = self.collectors[index]
+                collector.taken = monotonic()
+                collector._collect()
+                self.published.set()
+                if not collector.active.value:
+                    print("%s: Disabling %s" % (self.name, collector.name))
+                    continue
+                deadline = self._next_deadline(deadline, collector.INTERVAL)
+                heapq.heappush(deadlines, (deadline, index))
+        except KeyboardInterrupt:
+            print("%s: Caught Interrupt! Exiting..." % self.name)
+            self.kill.set()
+        for collector in self.collectors:
+            collector._clean()
+
     def terminate(self):
         print("%s: Received termination signal! Exiting.." % self.name)
         self.kill.set()
-
-    def _clean(self):
-        pass
+        if not self.is_alive():
+            return
+        self.join(self.STOP_TIMEOUT)
+        if self.is_alive():
+            # A collector is stuck, stop the engine the hard way
+            print("%s: Did not exit in time, killing it.." % self.name)
+            multiprocessing.Process.terminate(self)
+            self.join()
+
+    def wait_for_samples(self, since, timeout):
+        """ Block until every active collector has published a sample taken
+            at or after since. Gives up after timeout seconds and returns
+            False in that case. Called from the consumer process. """
+        deadline = monotonic() + timeout
+        while True:
+            # Clear before checking so a publish in between is not lost
+            self.published.clear()
+            fresh = True
+            for collector in self.collectors:
+                if collector.active.value and collector.stamp.value < since:
+                    fresh = False
+                    break
+            if fresh:
+                return True
+            remaining = deadline - monotonic()
+            if remaining <= 0 or self.kill.is_set():
+                return False
+            self.published.wait(remaining)
 
 
 class BandwidthCollector(Collector):
 
+    STATS = ["bw_rx", "bw_tx"]
+    # Byte counters of all interfaces in the current network namespace
+    PROC_NET_DEV = "/proc/net/dev"
+    # Position of the rx and tx byte counters after the interface name
+    RX_BYTES = 0
+    TX_BYTES = 8
+    INTERVAL = 0.1
+
     def __init__(self, iface_list, shared_stats, stats_dict):
-        Collector.__init__(self, iface_list)
+        Collector.__init__(self, iface_list, shared_stats,
+                           stats_rows(stats_dict, self.STATS))
         self.name = 'StatsCollector'
-        self.stats = shared_stats
+        self.stats = self.sample
         self.stats_dict = stats_dict
         self.stats_offset = len(stats_dict)
+        self.iface_index = {}
+        for index, iface in enumerate(iface_list):
+            self.iface_index[iface] = index
+        num_ifaces = len(iface_list)
+        self.counters = np.zeros(shape=(2, num_ifaces), dtype=np.int64)
+        self.prev_counters = np.zeros(shape=(2, num_ifaces), dtype=np.int64)
+        self.prev_time = None
+        self.dev_file = None
 
-    def _get_bandwidths(self, iface_list):
+    def _setup(self):
+        self.dev_file = open(self.PROC_NET_DEV, 'r')
 
-        processes = []
-        for iface in iface_list:
-            cmd = (" ifstat -i %s -b -q 0.5 1 | awk \'{if (NR==3) print $0}\' | \
-                   awk \'{$1=$1}1\' OFS=\", \"" % (iface))
-            proc = subprocess.Popen([cmd], stdout=subprocess.PIPE,
-                                    shell=True)
-            processes.append((proc, iface))
-
-        for index, (proc, iface) in enumerate(processes):
-            proc.wait()
-            output, _ = proc.communicate()
-            output = output.decode()
-            bw = output.split(',')
-            if bw[0] != 'n/a' and bw[1] != ' n/a\n':
-                bps_rx = int(float(bw[0]) * 1000)
-                bps_tx = int(float(bw[1]) * 1000)
-                self.stats[self.stats_dict["bw_rx"]][index] = bps_rx
-                self.stats[self.stats_dict["bw_tx"]][index] = bps_tx
+    def _clean(self):
+        if self.dev_file:
+            self.dev_file.close()
+
+    def _read_counters(self):
+        # Read the counters of all interfaces with a single read
+        self.dev_file.seek(0)
+        lines = self.dev_file.read().split('\n')
+        # The first two lines of the file are headers
+        for line in lines[2:]:
+            iface, _, data = line.partition(':')
+            index = self.iface_index.get(iface.strip())
+            if index is None:
+                continue
+            fields = data.split()
+            self.counters[0][index] = int(fields[self.RX_BYTES])
+            self.counters[1][index] = int(fields[self.TX_BYTES])
+
+    def _get_bandwidths(self, iface_list):
+        now = monotonic()
+        self._read_counters()
+        if self.prev_time is not None:
+            # Rates in bits per second from the counter deltas
+            elapsed = now - self.prev_time
+            rates = (self.counters - self.prev_counters) * 8 / elapsed
+            np.clip(rates, 0, None, out=rates)
+            self.stats[self.stats_dict["bw_rx"]] = rates[0]
+            self.stats[self.stats_dict["bw_tx"]] = rates[1]
+        np.copyto(self.prev_counters, self.counters)
+        self.prev_time = now
 
     def _collect(self):
         self._get_bandwidths(self.iface_list)
+        self._publish()
 
 
 class Qdisc(ctypes.Structure):
     pass
 
 
+class QdiscMonitor(ctypes.Structure):
+    pass
+
+
 class QueueCollector(Collector):
 
+    # The row order in which collect_qdisc_stats writes the stats
+    STATS = ["backlog", "olimit", "drops"]
+    # Queues change quickly, sample them twice as often
+    INTERVAL = 0.05
+
     def __init__(self, iface_list, shared_stats, stats_dict):
-        Collector.__init__(self, iface_list)
+        Collector.__init__(self, iface_list, shared_stats,
+                           stats_rows(stats_dict, self.STATS))
+        if [stats_dict[key] for key in self.STATS] != list(
+                range(self.rows.start, self.rows.stop)):
+            raise ValueError("Queue stats must be ordered as %s" % self.STATS)
         self.name = 'QueueCollector'
-        self.stats = shared_stats
+        self.stats = self.sample
         self.stats_dict = stats_dict
         self.stats_offset = len(stats_dict)
         self.q_lib = self._init_stats()
+        self.monitor = None
 
     def _init_stats(self):
         # init qdisc C library
         q_lib = ctypes.CDLL(FILE_DIR + '/libqdisc_stats.so')
         q_lib.init_qdisc_monitor.argtypes = [ctypes.c_char_p]
         q_lib.init_qdisc_monitor.restype = ctypes.POINTER(Qdisc)
+        q_lib.create_qdisc_monitor.argtypes = [
+            ctypes.POINTER(ctypes.c_char_p), ctypes.c_int]
+        q_lib.create_qdisc_monitor.restype = ctypes.POINTER(QdiscMonitor)
+        q_lib.collect_qdisc_stats.argtypes = [
+            ctypes.POINTER(QdiscMonitor), ctypes.POINTER(ctypes.c_uint64)]
+        q_lib.collect_qdisc_stats.restype = ctypes.c_int
+        q_lib.destroy_qdisc_monitor.argtypes = [ctypes.POINTER(QdiscMonitor)]
+        for getter in ("backlog", "drops", "overlimits", "packets", "bytes",
+                       "qlen", "requeues", "rate_bps", "rate_pps"):
+            getattr(q_lib, "get_qdisc_%s" % getter).restype = ctypes.c_uint64
         return q_lib
 
-    # def _init_qdiscs(self, iface_list, q_lib):
-    #     self.qdisc_map = {}
-    #     for iface in iface_list:
-    #         qdisc = q_lib.init_qdisc_monitor(iface)
-    #         print (qdisc)
-    #         self.qdisc_map[iface] = qdisc
+    def _setup(self):
+        # The netlink socket has to be opened in the collector process
+        ifaces = [iface.encode('ascii') for iface in self.iface_list]
+        self.iface_names = (ctypes.c_char_p * len(ifaces))(*ifaces)
+        self.monitor = self.q_lib.create_qdisc_monitor(
+            self.iface_names, len(ifaces))
+        if not self.monitor:
+            print("%s: Could not create qdisc monitor!" % self.name)
+            self.active.value = False
+            return
+        # The stats are written directly into our rows of the sample
+        self.q_stats = self.sample[self.rows]
+        self.q_stats_ptr = self.q_stats.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_uint64))
 
-    # def _clean(self):
-    #     for iface in self.iface_list:
-    #         qdisc = self.qdisc_map[iface]
-    #         self.q_lib.delete_qdisc_monitor(qdisc)
+    def _clean(self):
+        if self.monitor:
+            self.q_lib.destroy_qdisc_monitor(self.monitor)
+            self.monitor = None
 
     def _get_qdisc_stats(self, iface_list):
-        for index, iface in enumerate(iface_list):
-            qdisc = self.q_lib.init_qdisc_monitor(iface.encode('ascii'))
-            queue_backlog = self.q_lib.get_qdisc_backlog(qdisc)
-            queue_drops = self.q_lib.get_qdisc_drops(qdisc)
-            queue_overlimits = self.q_lib.get_qdisc_overlimits(qdisc)
-            # queue_rate_bps = self.q_lib.get_qdisc_rate_bps(qdisc)
-            # queue_rate_pps = self.q_lib.get_qdisc_rate_pps(qdisc)
-            self.stats[self.stats_dict["backlog"]][index] = queue_backlog
-            self.stats[self.stats_dict["olimit"]][index] = queue_overlimits
-            self.stats[self.stats_dict["drops"]][index] = queue_drops
-            # # tx rate
-            # self.stats[index][self.stats_dict["rate_bps"]] = queue_rate_bps
-            # # packet rate
-            # self.stats[index][self.stats_dict["rate_pps"]] = queue_rate_pps
-            self.q_lib.delete_qdisc_monitor(qdisc)
-
-    def _get_qdisc_stats_old(self, iface_list):
-        re_dropped = re.compile(r'(?<=dropped )[ 0-9]*')
-        re_overlimit = re.compile(r'(?<=overlimits )[ 0-9]*')
-        re_queued = re.compile(r'backlog\s[^\s]+\s([\d]+)p')
-        for iface in iface_list:
-            tmp_queues = self.stats[iface]
-            cmd = "tc -s qdisc show dev %s" % (iface)
-            drop_return = {}
-            over_return = {}
-            queue_return = {}
-            try:
-                output = subprocess.check_output(cmd.split()).decode()
-                drop_return = re_dropped.findall(output)
-                over_return = re_overlimit.findall(output)
-                queue_return = re_queued.findall(output)
-            except Exception:
-                # print("Error Collecting Queues: %s" % e)
-                drop_return[0] = 0
-                over_return[0] = 0
-                queue_return[0] = 0
-                self.kill.set()
-            tmp_queues["drops"] = int(drop_return[0])
-            tmp_queues["overlimits"] = int(over_return[0])
-            tmp_queues["queues"] = int(queue_return[0])
-            self.stats[iface] = tmp_queues
+        # One netlink dump per cycle fills the stats of all interfaces
+        err = self.q_lib.collect_qdisc_stats(self.monitor, self.q_stats_ptr)
+        if err:
+            print("%s: Error collecting qdisc stats %d" % (self.name, err))
 
     def _collect(self):
         self._get_qdisc_stats(self.iface_list)
-        # We are too fast, let it rest for a bit...
-        time.sleep(0.05)
+        self._publish()
+
+
+class PacketRing(object):
+    """ A TPACKET_V2 receive ring bound to one interface. Only the headers
+        of IPv4 frames are copied into the ring. """
+    SOL_PACKET = 263
+    PACKET_VERSION = 10
+    PACKET_RX_RING = 5
+    TPACKET_V2 = 1
+    TP_STATUS_KERNEL = 0
+    TP_STATUS_USER = 1
+    ETH_P_IP = 0x0800
+    # Ethernet and IPv4 header without options
+    SNAP_LEN = 34
+    BLOCK_SIZE = 4096
+    BLOCK_NR = 8
+    FRAME_SIZE = 128
+    FRAME_NR = BLOCK_SIZE // FRAME_SIZE * BLOCK_NR
+    # tp_status is the first field of tpacket2_hdr, tp_net is at offset 14
+    STATUS = struct.Struct("I")
+    NET_OFFSET = struct.Struct("H")
+
+    def __init__(self, iface):
+        self.iface = iface
+        self.offset = 0
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        attach_ipv4_filter(self.sock, self.SNAP_LEN)
+        self.sock.setsockopt(self.SOL_PACKET, self.PACKET_VERSION,
+                             self.TPACKET_V2)
+        req = struct.pack("IIII", self.BLOCK_SIZE, self.BLOCK_NR,
+                          self.FRAME_SIZE, self.FRAME_NR)
+        self.sock.setsockopt(self.SOL_PACKET, self.PACKET_RX_RING, req)
+        self.ring = mmap.mmap(self.sock.fileno(),
+                              self.BLOCK_SIZE * self.BLOCK_NR)
+        # Only start receiving once the filter and the ring are in place
+        self.sock.bind((iface, self.ETH_P_IP))
+
+    def drain(self, callback):
+        """ Hand the source and destination address of every pending frame
+            to callback and return the frames to the kernel. """
+        ring = self.ring
+        while True:
+            frame = self.offset * self.FRAME_SIZE
+            status = self.STATUS.unpack_from(ring, frame)[0]
+            if not status & self.TP_STATUS_USER:
+                break
+            net = frame + self.NET_OFFSET.unpack_from(ring, frame + 14)[0]
+            callback(ring[net + 12:net + 16], ring[net + 16:net + 20])
+            self.STATUS.pack_into(ring, frame, self.TP_STATUS_KERNEL)
+            self.offset = (self.offset + 1) % self.FRAME_NR
+
+    def close(self):
+        self.ring.close()
+        self.sock.close()
 
 
 class FlowCollector(Collector):
 
-    def __init__(self, iface_list, host_ips, shared_flows):
-        Collector.__init__(self, iface_list)
+    # A host pair counts as active if it was seen within the window
+    WINDOW = 1.0
+    INTERVAL = 0.1
+
+    def __init__(self, iface_list, host_ips, shared_flows, sparse=False):
+        Collector.__init__(self, iface_list, shared_flows)
         self.name = 'FlowCollector'
         self.host_ips = host_ips
-        self.shared_flows = shared_flows
+        self.shared_flows = self.sample
+        # Publish host index lists instead of one column per host
+        self.sparse = sparse
+        # Map packed IPv4 addresses to their host column
+        self.host_index = {}
+        for index, ip in enumerate(host_ips):
+            self.host_index[socket.inet_aton(ip)] = index
+        self.last_seen = np.full(
+            (len(iface_list), 2, len(self.host_index)), -np.inf)
+        self.rings = []
+
+    def _setup(self):
+        try:
+            for iface in self.iface_list:
+                self.rings.append(PacketRing(iface))
+        except (socket.error, OSError) as e:
+            print("%s: Could not open packet ring: %s" % (self.name, e))
+            self.active.value = False
+
+    def _clean(self):
+        for ring in self.rings:
+            ring.close()
+        del self.rings[:]
 
     def _get_flow_stats(self, iface_list):
-        processes = []
-        for iface in iface_list:
-            cmd = "sudo timeout 1 tcpdump -l -i %s " % iface
-            cmd += "-n -c 50 ip 2>/dev/null | "
-            cmd += "grep -P -o \'([0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+).*? > "
-            cmd += "([0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+)\' | "
-            cmd += "grep -P -o \'[0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+\' | "
-            cmd += "xargs -n 2 echo | awk \'!a[$0]++\'"
-            # output = subprocess.check_output(cmd, shell=True)
-            proc = subprocess.Popen(
-                [cmd], stdout=subprocess.PIPE, shell=True)
-            processes.append((proc, iface))
-        for index, (proc, iface) in enumerate(processes):
-            proc.wait()
-            output, _ = proc.communicate()
-            output = output.decode()
-            for row in output.split('\n'):
-                if row != '':
-                    src, dst = row.split(' ')
-                    for i, ip in enumerate(self.host_ips):
-                        i_src = 0
-                        i_dst = 1
-                        self.shared_flows[index][i_src][i] = 0
-                        self.shared_flows[index][i_dst][i] = 0
-                        if src == ip:
-                            self.shared_flows[index][i_src][i] = 1
-                        if dst == ip:
-                            self.shared_flows[index][i_dst][i] = 1
+        now = monotonic()
+        i_src = 0
+        i_dst = 1
+        for port, ring in enumerate(self.rings):
+            port_seen = self.last_seen[port]
+
+            def mark_flow(src, dst):
+                src_index = self.host_index.get(src)
+                dst_index = self.host_index.get(dst)
+                if src_index is not None:
+                    port_seen[i_src][src_index] = now
+                if dst_index is not None:
+                    port_seen[i_dst][dst_index] = now
+            ring.drain(mark_flow)
+        # Report every host that was active on a port within the window
+        active = self.last_seen >= now - self.WINDOW
+        if self.sparse:
+            # Keep the hosts that were seen last
+            encode_sparse_flows(np.where(active, self.last_seen, -np.inf),
+                                self.shared_flows)
+        else:
+            self.shared_flows[:] = active
 
     def _collect(self):
         self._get_flow_stats(self.iface_list)
+        self._publish()
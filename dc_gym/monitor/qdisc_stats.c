@@ -1,7 +1,36 @@
+#include <stdlib.h> // malloc, qsort, bsearch
+#include <string.h> // memset
 #include <net/if.h> // if_nametoindex
 #include <libnl3/netlink/route/qdisc.h>
 #include <netlink/object-api.h> // nl_object_free()
 
+/* Number of stats written per interface by collect_qdisc_stats */
+#define NUM_QDISC_STATS 3
+
+struct iface_slot {
+    int ifindex;
+    int slot;
+};
+
+struct qdisc_monitor {
+    struct nl_sock *sock;
+    struct nl_cache *qdisc_cache;
+    struct iface_slot *slots;   // sorted by ifindex for lookups
+    int num_ifaces;
+};
+
+struct stats_arg {
+    struct qdisc_monitor *mon;
+    uint64_t *stats;
+};
+
+void destroy_qdisc_monitor(struct qdisc_monitor *mon);
+
+static int cmp_iface_slot(const void *a, const void *b) {
+    return ((struct iface_slot *) a)->ifindex -
+           ((struct iface_slot *) b)->ifindex;
+}
+
 
 struct rtnl_qdisc *init_qdisc_monitor(char *interface) {
     struct nl_sock *sock;
@@ -30,57 +59,135 @@ struct rtnl_qdisc *init_qdisc_monitor(char *interface) {
     return qdisc;
 }
 
-int get_qdisc_packets(struct rtnl_qdisc *qdisc) {
+struct qdisc_monitor *create_qdisc_monitor(char **interfaces, int num_ifaces) {
+    struct qdisc_monitor *mon;
+    int i, err;
+    mon = calloc(1, sizeof(struct qdisc_monitor));
+    mon->slots = calloc(num_ifaces, sizeof(struct iface_slot));
+    mon->num_ifaces = num_ifaces;
+    for (i = 0; i < num_ifaces; i++) {
+        mon->slots[i].ifindex = if_nametoindex(interfaces[i]);
+        mon->slots[i].slot = i;
+        if (!mon->slots[i].ifindex)
+            fprintf(stderr,"Interface %s not found!\n", interfaces[i]);
+    }
+    qsort(mon->slots, num_ifaces, sizeof(struct iface_slot), cmp_iface_slot);
+    /* Keep one netlink socket and qdisc cache for the lifetime of the monitor */
+    mon->sock = nl_socket_alloc();
+    if(!mon->sock) {
+        fprintf(stderr,"Could not allocated socket!\n");
+        goto error;
+    }
+    err = nl_connect(mon->sock, NETLINK_ROUTE);
+    if (err) {
+        fprintf(stderr,"nl_connect: %s\n", nl_geterror(err));
+        goto error;
+    }
+    err = rtnl_qdisc_alloc_cache(mon->sock, &mon->qdisc_cache);
+    if (err) {
+        fprintf(stderr,"qdisc_alloc_cache: %s\n", nl_geterror(err));
+        goto error;
+    }
+    return mon;
+error:
+    destroy_qdisc_monitor(mon);
+    return NULL;
+}
+
+static void fill_qdisc_stats(struct nl_object *obj, void *data) {
+    struct stats_arg *arg = (struct stats_arg *) data;
+    struct rtnl_tc *tc = TC_CAST(obj);
+    struct iface_slot key, *match;
+    int num_ifaces = arg->mon->num_ifaces;
+    /* We only report the main qdisc of an interface */
+    if (rtnl_tc_get_parent(tc) != TC_H_ROOT)
+        return;
+    key.ifindex = rtnl_tc_get_ifindex(tc);
+    match = bsearch(&key, arg->mon->slots, num_ifaces,
+                    sizeof(struct iface_slot), cmp_iface_slot);
+    if (!match)
+        return;
+    arg->stats[match->slot] = rtnl_tc_get_stat(tc, RTNL_TC_BACKLOG);
+    arg->stats[num_ifaces + match->slot] = rtnl_tc_get_stat(tc, RTNL_TC_OVERLIMITS);
+    arg->stats[2 * num_ifaces + match->slot] = rtnl_tc_get_stat(tc, RTNL_TC_DROPS);
+}
+
+int collect_qdisc_stats(struct qdisc_monitor *mon, uint64_t *stats) {
+    /* Refill the cache with a single dump and write the backlog, overlimits,
+     * and drops of all interfaces as rows of a (3, num_ifaces) matrix. */
+    struct stats_arg arg = { mon, stats };
+    int err = nl_cache_refill(mon->sock, mon->qdisc_cache);
+    if (err) {
+        fprintf(stderr,"nl_cache_refill: %s\n", nl_geterror(err));
+        return err;
+    }
+    memset(stats, 0, NUM_QDISC_STATS * mon->num_ifaces * sizeof(uint64_t));
+    nl_cache_foreach(mon->qdisc_cache, fill_qdisc_stats, &arg);
+    return 0;
+}
+
+void destroy_qdisc_monitor(struct qdisc_monitor *mon) {
+    if (!mon)
+        return;
+    if (mon->qdisc_cache)
+        nl_cache_free(mon->qdisc_cache);
+    if (mon->sock)
+        nl_socket_free(mon->sock);
+    free(mon->slots);
+    free(mon);
+}
+
+uint64_t get_qdisc_packets(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_PACKETS);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_PACKETS);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_bytes(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_bytes(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_BYTES);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_BYTES);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_rate_bps(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_rate_bps(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_RATE_BPS);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_RATE_BPS);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_rate_pps(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_rate_pps(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_RATE_PPS);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_RATE_PPS);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_qlen(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_qlen(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_QLEN);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_QLEN);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_backlog(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_backlog(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_BACKLOG);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_BACKLOG);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_drops(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_drops(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_DROPS);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_DROPS);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_requeues(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_requeues(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_REQUEUES);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_REQUEUES);
     return get_qdisc_backlog;
 }
 
-int get_qdisc_overlimits(struct rtnl_qdisc *qdisc) {
+uint64_t get_qdisc_overlimits(struct rtnl_qdisc *qdisc) {
     /* Query current queue length on the interface */
-    int get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_OVERLIMITS);
+    uint64_t get_qdisc_backlog = rtnl_tc_get_stat(TC_CAST(qdisc), RTNL_TC_OVERLIMITS);
     return get_qdisc_backlog;
 }
 
@@ -3,6 +3,7 @@
 
 import ctypes
 import os
+import numpy as np
 
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -11,9 +12,21 @@ class Qdisc(ctypes.Structure):
     pass
 
 
+class QdiscMonitor(ctypes.Structure):
+    pass
+
+
 q_lib = ctypes.CDLL(FILE_DIR + '/libqdisc_stats.so')
 q_lib.init_qdisc_monitor.argtypes = [ctypes.c_char_p]
 q_lib.init_qdisc_monitor.restype = ctypes.POINTER(Qdisc)
+for getter in ("backlog", "drops", "overlimits", "packets"):
+    getattr(q_lib, "get_qdisc_%s" % getter).restype = ctypes.c_uint64
+q_lib.create_qdisc_monitor.argtypes = [
+    ctypes.POINTER(ctypes.c_char_p), ctypes.c_int]
+q_lib.create_qdisc_monitor.restype = ctypes.POINTER(QdiscMonitor)
+q_lib.collect_qdisc_stats.argtypes = [
+    ctypes.POINTER(QdiscMonitor), ctypes.POINTER(ctypes.c_uint64)]
+q_lib.destroy_qdisc_monitor.argtypes = [ctypes.POINTER(QdiscMonitor)]
 qdisc = q_lib.init_qdisc_monitor("sw1-eth1")
 qdisc2 = q_lib.init_qdisc_monitor("sw1-eth3")
 print(q_lib.get_qdisc_backlog(qdisc))
@@ -26,3 +39,11 @@ print(q_lib.get_qdisc_overlimits(qdisc2))
 print(q_lib.get_qdisc_packets(qdisc2))
 q_lib.delete_qdisc_monitor(qdisc)
 q_lib.delete_qdisc_monitor(qdisc2)
+# The persistent monitor reports both interfaces with a single dump
+ifaces = (ctypes.c_char_p * 2)(b"sw1-eth1", b"sw1-eth3")
+monitor = q_lib.create_qdisc_monitor(ifaces, 2)
+stats = np.zeros((3, 2), dtype=np.uint64)
+q_lib.collect_qdisc_stats(
+    monitor, stats.ctypes.data_as(ctypes.POINTER(ctypes.c_uint64)))
+print(stats)
+q_lib.destroy_qdisc_monitor(monitor)
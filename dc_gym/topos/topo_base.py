@@ -1,7 +1,11 @@
 import os
 import sys
+import time
 import random
+import shutil
 import string
+import tempfile
+from collections import OrderedDict
 
 from mininet.log import info, output, warn, error, debug
 from mininet.node import RemoteController
@@ -9,17 +13,16 @@ from mininet.net import Mininet
 from mininet.log import setLogLevel
 from mininet.node import CPULimitedHost
 from mininet.util import custom
+from topos.topo_layout import BASE_CONF
 cwd = os.getcwd()
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, FILE_DIR)
 
-DEFAULT_CONF = {
-    "max_queue": 0.5e6,         # max queue of switches in bytes
-    "max_capacity": 10e6,       # max bw capacity of link in bytes
-    "min_rate": 0.1e6,          # min possible bw of an interface in bytes
-    "parallel_envs": False,     # enable ids to support multiple topologies
-    "tcp_policy": "tcp"
-}
+DEFAULT_CONF = dict(BASE_CONF)
+
+# Proactive route of a destination, installed for both ARP and IP
+ROUTE_FMT = "table=0,idle_timeout=0,hard_timeout=0,priority=%d,%s," \
+            "nw_dst=%s,actions=%s"
 
 
 def merge_dicts(dict1, dict2):
@@ -40,8 +43,11 @@ class BaseTopo:
         self.topo = None
         self.started = False
         self.host_ctrl_map = {}
+        self.host_sw_map = {}
         self.host_ips = []
         self.net = None
+        # Seconds spent in each phase of the last network start
+        self.startup_times = OrderedDict()
         self.switch_id = self._generate_switch_id(self.conf)
         self.prev_cc = self._get_active_congestion_control()
         self._set_congestion_control(self.conf)
@@ -84,41 +90,61 @@ class BaseTopo:
             for index, switch in self.topo.ports[host].items():
                 switch_iface = switch[0] + "-eth" + str(switch[1])
                 self.host_ctrl_map[switch_iface] = ctrl_iface
+                self.host_sw_map[switch_iface] = host
 
     def _config_topo(self, ovs_v, is_ecmp):
         raise NotImplementedError("Method _config_topo not implemented!")
 
-    def _apply_qdisc(self, port):
-        """ Here be dragons... """
-        # tc_cmd = "tc qdisc add dev %s " % (port)
-        # cmd = "root handle 1: hfsc default 10"
-        # print (tc_cmd + cmd)
-        # os.system(tc_cmd + cmd)
-        # tc_cmd = "tc class add dev %s " % (port)
-        # cmd = "parent 1: classid 1:10 hfsc sc rate %dbit ul rate %dbit" % (
-        #     self.conf["max_capacity"], self.conf["max_capacity"])
-        # print (tc_cmd + cmd)
-        # os.system(tc_cmd + cmd)
-
-        tc_cmd = "tc qdisc add dev %s " % (port)
-        cmd = "root handle 1: htb default 10 "
-        # cmd = "root handle 1: estimator 250msec 1sec htb default 10 "
+    def _get_proactive_flows(self, topo):
+        """ Return the flow and group tables of all switches as two dicts
+            that map a switch to a list of ovs-ofctl entries. """
+        raise NotImplementedError(
+            "Method _get_proactive_flows not implemented!")
+
+    def _add_route(self, flows, sw, nw_dst, actions, priority=10):
+        for proto in ("arp", "ip"):
+            flows.setdefault(sw, []).append(
+                ROUTE_FMT % (priority, proto, nw_dst, actions))
+
+    def _install_table(self, table_dir, cmd, sw, entries):
+        table_file = "%s/%s.%s" % (table_dir, sw, cmd)
+        with open(table_file, "w") as table:
+            table.write("\n".join(entries) + "\n")
+        os.system("ovs-ofctl -O OpenFlow13 %s %s %s" % (cmd, sw, table_file))
+
+    def _install_proactive(self, topo):
+        """ Install the tables of each switch with one ovs-ofctl call per
+            table instead of one call per entry. """
+        flows, groups = self._get_proactive_flows(topo)
+        table_dir = tempfile.mkdtemp(prefix="iroko_flows_")
+        try:
+            # Flows may point to groups, so groups have to exist first
+            for sw, entries in groups.items():
+                self._install_table(table_dir, "add-groups", sw, entries)
+            for sw, entries in flows.items():
+                self._install_table(table_dir, "add-flows", sw, entries)
+        finally:
+            shutil.rmtree(table_dir)
+
+    def _get_qdisc_cmds(self, port):
+        """ Return the tc commands that build the qdisc tree of a port. """
+        cmds = []
+        cmd = "qdisc add dev %s " % (port)
+        cmd += "root handle 1: htb default 10 "
         cmd += " direct_qlen 0 "
-        debug(tc_cmd + cmd)
-        os.system(tc_cmd + cmd)
-        tc_cmd = "tc class add dev %s " % (port)
-        cmd = "parent 1: classid 1:10 htb rate %dbit burst %d" % (
+        cmds.append(cmd)
+        cmd = "class add dev %s " % (port)
+        cmd += "parent 1: classid 1:10 htb rate %dbit burst %d" % (
             self.conf["max_capacity"], self.conf["max_capacity"])
-        debug(tc_cmd + cmd)
-        os.system(tc_cmd + cmd)
+        cmds.append(cmd)
 
         if self.conf["tcp_policy"] == "dctcp":
             # Apply aggressive RED to mark excess packets in the queue
             limit = int(self.conf["max_queue"])
             max_q = limit / 3
             min_q = max_q / 3
-            tc_cmd = "tc qdisc add dev %s " % (port)
-            cmd = "parent 1:10 handle 20:1 red "
+            cmd = "qdisc add dev %s " % (port)
+            cmd += "parent 1:10 handle 20:1 red "
             cmd += "limit %d " % (limit)
             cmd += "bandwidth  %dbit " % self.conf["max_capacity"]
             cmd += "avpkt 1000 "
@@ -126,14 +152,31 @@ class BaseTopo:
             cmd += "max %d " % (max_q)
             cmd += "probability 0.001"
             cmd += " ecn "
-            debug(tc_cmd + cmd)
-            os.system(tc_cmd + cmd)
+            cmds.append(cmd)
         else:
             limit = int(self.conf["max_queue"])
-            tc_cmd = "tc qdisc add dev %s " % (port)
-            cmd = "parent 1:10 handle 20:1 bfifo "
+            cmd = "qdisc add dev %s " % (port)
+            cmd += "parent 1:10 handle 20:1 bfifo "
             cmd += " limit %d" % (limit)
-            os.system(tc_cmd + cmd)
+            cmds.append(cmd)
+        return cmds
+
+    def _apply_qdisc(self, port):
+        """ Here be dragons... """
+        # tc_cmd = "tc qdisc add dev %s " % (port)
+        # cmd = "root handle 1: hfsc default 10"
+        # print (tc_cmd + cmd)
+        # os.system(tc_cmd + cmd)
+        # tc_cmd = "tc class add dev %s " % (port)
+        # cmd = "parent 1: classid 1:10 hfsc sc rate %dbit ul rate %dbit" % (
+        #     self.conf["max_capacity"], self.conf["max_capacity"])
+        # print (tc_cmd + cmd)
+        # os.system(tc_cmd + cmd)
+
+        # cmd = "root handle 1: estimator 250msec 1sec htb default 10 "
+        for cmd in self._get_qdisc_cmds(port):
+            debug("tc " + cmd)
+            os.system("tc " + cmd)
 
         # tc_cmd = "tc qdisc add dev %s " % (port)
         # cmd = "parent 1:10 handle 20:1 netem limit %d rate 10mbit" % (
@@ -189,11 +232,30 @@ class BaseTopo:
 
         # os.system("ip link set %s txqueuelen 1" % (port))
 
+    def _apply_qdiscs_batch(self, ports):
+        """ Configure the qdiscs of all ports with a single tc process. """
+        batch = tempfile.NamedTemporaryFile(
+            mode="w", prefix="iroko_tc_", delete=False)
+        with batch:
+            for port in ports:
+                for cmd in self._get_qdisc_cmds(port):
+                    batch.write(cmd + "\n")
+        # Like the per-command path, keep going if a single command fails
+        debug("tc -force -batch %s" % batch.name)
+        os.system("tc -force -batch %s" % batch.name)
+        os.remove(batch.name)
+
     def _config_links(self):
+        ports = []
         for switch in self.net.switches:
             for port in switch.intfList():
                 if port.name != "lo":
-                    self._apply_qdisc(port)
+                    ports.append(port)
+        if self.conf["tc_batch"]:
+            self._apply_qdiscs_batch(ports)
+        else:
+            for port in ports:
+                self._apply_qdisc(port)
 
     def _configure_hosts(self):
         for host in self.net.hosts:
@@ -221,13 +283,18 @@ class BaseTopo:
             elif self.conf["tcp_policy"] == "pcc":
                 host.cmd("sysctl -w net.ipv4.tcp_congestion_control=pcc")
 
+    def _timed(self, phase, func, *args):
+        start = time.time()
+        func(*args)
+        self.startup_times[phase] = time.time() - start
+
     def _configure_network(self):
         c0 = RemoteController(self.switch_id + "c0")
         self.net.addController(c0)
-        self._config_links()
-        self._config_topo()
-        self._connect_controller(c0)
-        self._configure_hosts()
+        self._timed("qdiscs", self._config_links)
+        self._timed("flows", self._config_topo)
+        self._timed("control links", self._connect_controller, c0)
+        self._timed("hosts", self._configure_hosts)
         output("Testing reachability after configuration...\n")
         # self.net.ping()
         # output("Testing bandwidth after configuration...\n")
@@ -264,6 +331,16 @@ class BaseTopo:
     def get_host_ports(self):
         return self.host_ctrl_map.keys()
 
+    def get_host_netns(self):
+        """ Return the pid and network interface of the host behind each
+            entry of host_ctrl_map. The pid identifies the network
+            namespace of the host. """
+        host_netns = []
+        for switch_iface in self.host_ctrl_map:
+            host = self.net.get(self.host_sw_map[switch_iface])
+            host_netns.append((host.pid, host.intfList()[0].name))
+        return host_netns
+
     def get_num_hosts(self):
         num_hosts = 0
         for node, links in self.topo.ports.items():
@@ -279,11 +356,18 @@ class BaseTopo:
     def start_network(self):
         # Start Mininet
         host = custom(CPULimitedHost)
+        self.startup_times.clear()
+        start = time.time()
         self.net = Mininet(topo=self.topo,
                            controller=None, autoSetMacs=True)
-        self.net.start()
+        self.startup_times["build"] = time.time() - start
+        self._timed("start", self.net.start)
         self._configure_network()
         self.started = True
+        output("Network startup took %.3fs:\n" %
+               sum(self.startup_times.values()))
+        for phase, seconds in self.startup_times.items():
+            output("  %-14s %.3fs\n" % (phase, seconds))
 
     def stop_network(self):
         if self.started:
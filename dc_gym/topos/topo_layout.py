@@ -0,0 +1,231 @@
+from collections import OrderedDict
+
+# The layouts only need addSwitch, addHost, and addLink of the topology
+# they are mixed into. They do not depend on Mininet, so the simulator
+# builds the same nodes, ports, and addresses as the emulated network.
+
+BASE_CONF = {
+    "max_queue": 0.5e6,         # max queue of switches in bytes
+    "max_capacity": 10e6,       # max bw capacity of link in bytes
+    "min_rate": 0.1e6,          # min possible bw of an interface in bytes
+    "parallel_envs": False,     # enable ids to support multiple topologies
+    "tcp_policy": "tcp",
+    "tc_batch": True,           # configure all port qdiscs with one tc call
+}
+
+DUMBBELL_CONF = {
+    "num_hosts": 4,             # number of hosts in the topology
+    "traffic_files": ['incast_2', 'incast_4', 'incast_8', 'incast_16',
+                      'incast_32', 'incast_64', 'incast_128', 'incast_256',
+                      'incast_512', 'incast_1024'],
+}
+
+NONBLOCK_CONF = {
+    "num_hosts": 16,            # number of hosts in the topology
+    "traffic_files": ['stag_prob_0_2_3_data', 'stag_prob_1_2_3_data',
+                      'stag_prob_2_2_3_data', 'stag_prob_0_5_3_data',
+                      'stag_prob_1_5_3_data', 'stag_prob_2_5_3_data',
+                      'stride1_data', 'stride2_data', 'stride4_data',
+                      'stride8_data', 'random0_data', 'random1_data',
+                      'random2_data', 'random0_bij_data', 'random1_bij_data',
+                      'random2_bij_data', 'random_2_flows_data',
+                      'random_3_flows_data', 'random_4_flows_data',
+                      'hotspot_one_to_one_data'],
+    "traffic_files": ['stride4_data'],
+}
+
+FATTREE_CONF = {
+    "num_hosts": 16,            # number of hosts in the topology
+    "traffic_files": ['stag_prob_0_2_3_data', 'stag_prob_1_2_3_data',
+                      'stag_prob_2_2_3_data', 'stag_prob_0_5_3_data',
+                      'stag_prob_1_5_3_data', 'stag_prob_2_5_3_data',
+                      'stride1_data', 'stride2_data', 'stride4_data',
+                      'stride8_data', 'random0_data', 'random1_data',
+                      'random2_data', 'random0_bij_data', 'random1_bij_data',
+                      'random2_bij_data', 'random_2_flows_data',
+                      'random_3_flows_data', 'random_4_flows_data',
+                      'hotspot_one_to_one_data'],
+    "traffic_files": ['stride4_data'],
+    "fanout": 4,
+    "density": 2,
+    "ecmp": True,
+}
+
+
+def get_subnet_ips(hostlist, hosts_per_subnet):
+    """ Assign 10.<subnet>.0.<host> to the hosts in order, starting a new
+        subnet every hosts_per_subnet hosts. """
+    host_ips = OrderedDict()
+    for index, host in enumerate(hostlist):
+        host_ips[host] = "10.%d.0.%d" % (index // hosts_per_subnet + 1,
+                                         index % hosts_per_subnet + 1)
+    return host_ips
+
+
+class DumbbellLayout(object):
+    """ Two switches joined by one link, odd hosts on the west switch and
+        even hosts on the east switch. """
+
+    def __init__(self, hosts, switch_id):
+        self.num_hosts = hosts
+        self.switch_w = None
+        self.switch_e = None
+        self.hosts_w = []
+        self.hosts_e = []
+        self.switchlist = []
+        self.hostlist = []
+        self.host_ips = {}
+        self.switch_id = switch_id
+
+    def create_nodes(self):
+        self._create_switches()
+        self._create_hosts(self.num_hosts)
+
+    def _create_switches(self):
+        sw_w_name = self.switch_id + "s1"
+        sw_e_name = self.switch_id + "s2"
+        self.switch_w = self.addSwitch(name=sw_w_name)
+        self.switch_e = self.addSwitch(name=sw_e_name)
+        self.switchlist.append(self.switch_w)
+        self.switchlist.append(self.switch_e)
+
+    def _create_hosts(self, num):
+        """
+            Create hosts.
+        """
+        for i in range(1, num + 1):
+            name = "h" + str(i)
+            c_class = i // 256
+            d_class = i % 510
+            if (i % 2) == 1:
+                ip = "10.1.%d.%d" % (c_class, (d_class + 1) // 2)
+                host = self.addHost(name=name, cpu=1.0 / num, ip=ip)
+                self.hosts_w.append(host)
+            else:
+                ip = "10.2.%d.%d" % (c_class, (d_class + 2) // 2)
+                host = self.addHost(name=name, cpu=1.0 / num, ip=ip)
+                self.hosts_e.append(host)
+            self.host_ips[host] = ip
+
+        self.hostlist = self.hosts_w + self.hosts_e
+
+    def create_links(self):
+        """
+                Add links between switch and hosts.
+        """
+        self.addLink(self.switch_w, self.switch_e)
+        for host in self.hosts_w:
+            self.addLink(self.switch_w, host)
+        for host in self.hosts_e:
+            self.addLink(self.switch_e, host)
+
+    def get_host_ips(self):
+        return OrderedDict((host, self.host_ips[host])
+                           for host in self.hostlist)
+
+
+class NonBlockingLayout(object):
+    """ A single switch that connects all hosts. """
+
+    def __init__(self, num_hosts, switch_id):
+        self.core_switch = 1
+        self.num_hosts = num_hosts
+        self.switch_id = switch_id
+        self.switchlist = []
+        self.hostlist = []
+
+    def create_nodes(self):
+        self.create_core_switch(self.core_switch)
+        self.create_hosts(self.num_hosts)
+
+    def _add_switch(self, number, switch_list):
+        """
+                Create switches.
+        """
+        for index in range(1, number + 1):
+            sw_name = "%ss%d" % (self.switch_id, index)
+            switch_list.append(self.addSwitch(sw_name))
+
+    def create_core_switch(self, NUMBER):
+        self._add_switch(NUMBER, self.switchlist)
+
+    def create_hosts(self, num):
+        """ Create hosts. """
+        for i in range(1, num + 1):
+            host_name = "h%d" % i
+            self.hostlist.append(self.addHost(host_name, cpu=1.0 / num))
+
+    def create_links(self):
+        """
+                Add links between switch and hosts.
+        """
+        for sw in self.switchlist:
+            for host in self.hostlist:
+                # use_htb=False
+                self.addLink(sw, host)
+
+    def get_host_ips(self):
+        return get_subnet_ips(self.hostlist, 2)
+
+
+class FattreeLayout(object):
+    """ A k-ary fat tree of core, aggregation, and edge switches with
+        density hosts per edge switch. """
+
+    def __init__(self, fanout, density, switch_id):
+        self.pod = fanout
+        self.density = density
+        self.core_switch_num = (fanout // 2)**2
+        self.agg_switch_num = fanout * fanout // 2
+        self.edge_switch_num = fanout * fanout // 2
+        self.iHost = self.edge_switch_num * density
+        self.switch_id = switch_id
+        self.core_switches = []
+        self.agg_switches = []
+        self.edge_switches = []
+        self.hostlist = []
+
+    def create_nodes(self):
+        self._add_switches(self.core_switch_num, 1, self.core_switches)
+        self._add_switches(self.agg_switch_num, 2, self.agg_switches)
+        self._add_switches(self.edge_switch_num, 3, self.edge_switches)
+        self.create_hosts(self.iHost)
+
+    def _add_switches(self, number, level, switch_list):
+        """ Create switches. """
+        for index in range(1, number + 1):
+            sw_name = "%ss%d%d" % (self.switch_id, level, index)
+            switch_list.append(self.addSwitch(sw_name))
+
+    def create_hosts(self, num):
+        """ Create hosts. """
+        for i in range(1, num + 1):
+            host_name = "h%d" % i
+            self.hostlist.append(self.addHost(host_name, cpu=1.0 / num))
+
+    def create_links(self):
+        """ Add network links. """
+        # Core to Agg
+        end = self.pod // 2
+        for switch in range(0, self.agg_switch_num, end):
+            for i in range(0, end):
+                for j in range(0, end):
+                    self.addLink(
+                        self.core_switches[i * end + j],
+                        self.agg_switches[switch + i])
+        # Agg to Edge
+        for switch in range(0, self.agg_switch_num, end):
+            for i in range(0, end):
+                for j in range(0, end):
+                    self.addLink(
+                        self.agg_switches[switch +
+                                          i], self.edge_switches[switch + j])
+        # Edge to Host
+        for switch in range(0, self.edge_switch_num):
+            for i in range(0, self.density):
+                self.addLink(
+                    self.edge_switches[switch],
+                    self.hostlist[self.density * switch + i])
+
+    def get_host_ips(self):
+        return get_subnet_ips(self.hostlist, self.density)
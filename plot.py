@@ -10,10 +10,11 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
+from dc_gym.iroko_trace import load_trace
 
 MAX_BW = 10e6
-STATS_DICT = {"backlog": 0, "olimit": 1,
-              "drops": 2, "bw_rx": 3, "bw_tx": 4}
+# Trace columns required for plotting
+PLOT_COLUMNS = ["reward", "actions", "backlog", "bw_tx", "olimit", "drops"]
 
 PLOT_DIR = os.path.dirname(os.path.abspath(__file__)) + "/plots"
 ROOT = "results"
@@ -152,48 +153,48 @@ def preprocess_data(algo, runs, transport_dir):
                 "bw_tx": [], "olimit": [], "drops": []}
     for index in range(runs):
         run_dir = transport_dir + "run%d" % index
-        stats_file = '%s/%s/runtime_statistics.npy' % (
+        stats_dir = '%s/%s/runtime_statistics' % (
             run_dir, algo.lower())
-        print("Loading %s..." % stats_file)
-        with FileLock(stats_file + ".lock"):
+        print("Loading %s..." % stats_dir)
+        with FileLock(stats_dir + ".lock"):
             try:
-                statistics = np.load(stats_file).item()
+                statistics = load_trace(stats_dir, PLOT_COLUMNS)
             except Exception as e:
-                print("Error loading file %s" % stats_file, e)
+                print("Error loading trace %s" % stats_dir, e)
                 exit(1)
+        # All columns are memory-mapped with the shape (steps, ports/hosts)
         rewards = np.array(statistics["reward"])
-        host_actions = np.moveaxis(statistics["actions"], 0, -1)
-        port_stats = np.moveaxis(statistics["stats"], 0, -1)
-        port_queues = np.array(port_stats[STATS_DICT["backlog"]])
-        port_bws = np.array(port_stats[STATS_DICT["bw_tx"]])
-        port_overlimits = np.array(port_stats[STATS_DICT["olimit"]])
-        port_drops = np.array(port_stats[STATS_DICT["drops"]])
+        host_actions = statistics["actions"]
+        port_queues = statistics["backlog"]
+        port_bws = statistics["bw_tx"]
+        port_overlimits = statistics["olimit"]
+        port_drops = statistics["drops"]
         # rewards
         if rewards.size:
             run_list["rewards"].append(rewards)
         num_samples = len(rewards)
         # actions
         print("Computing mean of host actions per step.")
-        actions = host_actions.mean(axis=0)
+        actions = host_actions.mean(axis=1)
         if actions.size:
             run_list["actions"].append(actions)
         # queues
         print("Computing mean of interface queues per step.")
-        flat_queues = port_queues.mean(axis=0)
+        flat_queues = port_queues.mean(axis=1)
         if flat_queues.size:
             run_list["backlog"].append(flat_queues)
         # bandwidths
         print("Computing mean of interface bandwidth per step.")
-        flat_bw = port_bws.mean(axis=0)
+        flat_bw = port_bws.mean(axis=1)
         if flat_bw.size:
             run_list["bw_tx"].append(flat_bw)
         # overlimits
         print("Computing mean of interface overlimits per step.")
-        mean_overlimits = port_overlimits.mean(axis=0)
+        mean_overlimits = port_overlimits.mean(axis=1)
         if mean_overlimits.size:
             run_list["olimit"].append(mean_overlimits)
         # drops
-        mean_drops = port_drops.mean(axis=0)
+        mean_drops = port_drops.mean(axis=1)
         print("Computing mean of interface drops per step.")
         if mean_drops.size:
             run_list["drops"].append(mean_drops)
@@ -0,0 +1,127 @@
+from __future__ import print_function
+import argparse
+import os
+import numpy as np
+from dc_gym.iroko_trace import load_trace, load_header, TraceWriter
+from dc_gym.iroko_reward import RewardFunction
+
+# Meta data a trace needs to rebuild the reward function
+REQUIRED_META = ["stats_dict", "sw_ports", "host_ports",
+                 "max_queue", "max_capacity"]
+
+PARSER = argparse.ArgumentParser(
+    description="Recompute the rewards of recorded runtime_statistics "
+                "traces for other reward models.")
+PARSER.add_argument('trace_dirs', nargs='+',
+                    help='Trace folders, e.g. <output>/runtime_statistics.')
+PARSER.add_argument('--reward_model', '-r', dest='reward_models',
+                    action='append', default=None,
+                    help='Comma separated reward model, e.g. backlog,action. '
+                    'Can be given multiple times. Defaults to the model '
+                    'the trace was recorded with.')
+PARSER.add_argument('--chunk', dest='chunk', type=int, default=100000,
+                    help='Number of steps that are processed at once.')
+
+
+def get_model_name(reward_model):
+    return "-".join(reward_model)
+
+
+def get_out_dir(trace_dir):
+    # The results are stored next to the trace they were computed from
+    trace_dir = os.path.normpath(trace_dir)
+    return "%s_rewards" % trace_dir
+
+
+def recompute_rewards(trace_dir, reward_models=None, chunk=100000):
+    """ Recompute the per-step rewards of a trace for every reward model.
+        The results are written as a trace with one reward and one
+        component column per model. Returns the output folder or None if
+        the trace does not record enough meta data. Like the state manager,
+        the deltas of the first step are taken against zero. A soft reset
+        takes the deltas of its first step against stats that are not in
+        the trace, those steps use the last recorded step instead. """
+    meta = load_header(trace_dir)["meta"]
+    for key in REQUIRED_META:
+        if key not in meta:
+            print("Trace %s does not record %s, skipping." % (trace_dir, key))
+            return None
+    if reward_models is None:
+        reward_models = [meta["reward_model"]]
+    if meta.get("sample_delta", 1) != 1:
+        print("Warning: Trace %s has a sample delta of %s. Deltas span "
+              "multiple steps." % (trace_dir, meta["sample_delta"]))
+    stats_dict = meta["stats_dict"]
+    stat_names = sorted(stats_dict, key=stats_dict.get)
+    trace = load_trace(trace_dir, ["actions"] + stat_names)
+    num_steps = len(trace["actions"])
+    if num_steps == 0:
+        print("Trace %s contains no samples, skipping." % trace_dir)
+        return None
+    dopamins = []
+    columns = []
+    for reward_model in reward_models:
+        dopamin = RewardFunction(meta["host_ports"], meta["sw_ports"],
+                                 reward_model, meta["max_queue"],
+                                 meta["max_capacity"], stats_dict)
+        dopamins.append(dopamin)
+        name = get_model_name(reward_model)
+        columns.append((name, np.float64, ()))
+        columns.append((name + "_parts", np.float64,
+                        (len(dopamin.components),)))
+    out_meta = {"source": os.path.abspath(trace_dir),
+                "reward_models": reward_models,
+                "reward_components": [dopamin.components
+                                      for dopamin in dopamins]}
+    out_dir = get_out_dir(trace_dir)
+    writer = TraceWriter(out_dir, columns, chunk, out_meta)
+    # The state manager starts with zeroed stats, so does the first step
+    prev_stats = None
+    for start in range(0, num_steps, chunk):
+        end = min(start + chunk, num_steps)
+        stats = np.stack([trace[name][start:end] for name in stat_names],
+                         axis=1)
+        if prev_stats is None:
+            prev_stats = np.zeros_like(stats[0])
+        deltas = np.empty_like(stats)
+        deltas[0] = stats[0] - prev_stats
+        np.subtract(stats[1:], stats[:-1], out=deltas[1:])
+        prev_stats = stats[-1]
+        actions = trace["actions"][start:end]
+        results = []
+        for dopamin in dopamins:
+            results.extend(dopamin.get_rewards(stats, deltas, actions))
+        writer.extend(*results)
+    writer.close()
+    return out_dir
+
+
+def print_summary(trace_dir, out_dir):
+    header = load_header(out_dir)
+    recorded = load_trace(trace_dir, ["reward"])["reward"]
+    results = load_trace(out_dir)
+    meta = load_header(trace_dir)["meta"]
+    print("%-30s %12s %12s" % ("reward_model", "mean", "total"))
+    for reward_model in header["meta"]["reward_models"]:
+        rewards = results[get_model_name(reward_model)]
+        print("%-30s %12.4f %12.4f" % (get_model_name(reward_model),
+                                      rewards.mean(), rewards.sum()))
+        # Sanity check against the rewards of the original run
+        if reward_model == meta.get("reward_model"):
+            error = np.abs(rewards - recorded[:len(rewards)]).max()
+            print("%-30s %12.3g" % ("  max error to recorded", error))
+
+
+if __name__ == '__main__':
+    ARGS = PARSER.parse_args()
+    REWARD_MODELS = None
+    if ARGS.reward_models:
+        REWARD_MODELS = [model.split(",") for model in ARGS.reward_models]
+    for trace_folder in ARGS.trace_dirs:
+        print("Recomputing rewards of %s..." % trace_folder)
+        result_dir = recompute_rewards(trace_folder, REWARD_MODELS,
+                                       ARGS.chunk)
+        if result_dir is None:
+            continue
+        print("Wrote trace %s" % result_dir)
+        print_summary(trace_folder, result_dir)
@@ -14,7 +14,8 @@ OUTPUT_DIR = cwd + '/results'
 
 PARSER = argparse.ArgumentParser()
 PARSER.add_argument('--env', '-e', dest='env',
-                    default='iroko', help='The platform to run.')
+                    default='iroko',
+                    help='The platform to run: iroko, sim, or replay.')
 PARSER.add_argument('--topo', '-to', dest='topo',
                     default='dumbbell', help='The topology to operate on.')
 PARSER.add_argument('--timesteps', '-t', dest='timesteps',
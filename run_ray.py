@@ -25,7 +25,8 @@ OUTPUT_DIR = cwd + '/results'
 
 PARSER = argparse.ArgumentParser()
 PARSER.add_argument('--env', '-e', dest='env',
-                    default='iroko', help='The platform to run.')
+                    default='iroko',
+                    help='The platform to run: iroko, sim, or replay.')
 PARSER.add_argument('--topo', dest='topo',
                     default='dumbbell', help='The topology to operate on.')
 PARSER.add_argument('--num_hosts', dest='num_hosts',
@@ -51,6 +52,9 @@ PARSER.add_argument('--output', dest='output_dir', default=OUTPUT_DIR,
                     help='Folder which contains all the collected metrics.')
 PARSER.add_argument('--transport', dest='transport', default="udp",
                     help='Choose the transport protocol of the hosts.')
+PARSER.add_argument('--num_workers', '-w', dest='num_workers',
+                    type=int, default=1,
+                    help='Number of rollout workers, each runs its own env.')
 PARSER.add_argument('--tune', action="store_true", default=False,
                     help='Specify whether to perform hyperparameter tuning')
 ARGS = PARSER.parse_args()
@@ -116,6 +120,11 @@ def check_dir(directory):
 
 
 def get_env(env_config):
+    # Parallel workers must not write into the same output folder
+    worker_index = getattr(env_config, "worker_index", 0)
+    if worker_index > 0:
+        env_config = dict(env_config)
+        env_config["output_dir"] += "/worker%d" % worker_index
     return EnvFactory.create(env_config)
 
 
@@ -245,7 +254,7 @@ def configure_ray(agent):
         config = {}
     # Add the dynamic environment configuration
     config["clip_actions"] = True
-    config["num_workers"] = 1
+    config["num_workers"] = ARGS.num_workers
     config["num_gpus"] = 0
     config["batch_mode"] = "truncate_episodes"
     config["log_level"] = "ERROR"
@@ -259,6 +268,9 @@ def configure_ray(agent):
         "iterations": ARGS.timesteps,
         "tf_index": ARGS.pattern_index,
     }
+    if ARGS.num_workers > 1:
+        # Workers need unique switch names to share the machine
+        config["env_config"]["topo_conf"] = {"parallel_envs": True}
     if ARGS.timesteps > 50000:
         config["env_config"]["sample_delta"] = ARGS.timesteps / 50000
 
@@ -284,7 +296,8 @@ def init():
     print("Registering the DC environment...")
     register_env("dc_env", get_env)
     print("Starting Ray...")
-    ray.init(num_cpus=2, logging_level=logging.WARN)
+    ray.init(num_cpus=max(2, ARGS.num_workers + 1),
+             logging_level=logging.WARN)
 
     config = configure_ray(ARGS.agent)
     print("Starting experiment.")
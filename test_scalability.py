@@ -15,6 +15,7 @@ import ray.tune as tune
 # Iroko imports
 import dc_gym
 from dc_gym.factories import EnvFactory
+from dc_gym.iroko_trace import load_trace
 # Fixed matplotlib import
 import matplotlib
 matplotlib.use('Agg')
@@ -137,10 +138,6 @@ def tune_run(config):
     tune.run_experiments(experiment, scheduler=scheduler)
 
 
-STATS_DICT = {"backlog": 0, "olimit": 1,
-              "drops": 2, "bw_rx": 3, "bw_tx": 4}
-
-
 def check_plt_dir(plt_name):
     plt_dir = os.path.dirname(plt_name)
     if not plt_dir == '' and not os.path.exists(plt_dir):
@@ -153,18 +150,17 @@ def plot_scalability_graph(increments, data_dir, plot_dir, name):
     bw_list["rx"] = []
     bw_list["tx"] = []
     for increment in increments:
-        stats_file = '%s/%s_hosts/runtime_statistics.npy' % (
+        stats_dir = '%s/%s_hosts/runtime_statistics' % (
             data_dir, increment)
-        print("Loading %s..." % stats_file)
-        with FileLock(stats_file + ".lock"):
+        print("Loading %s..." % stats_dir)
+        with FileLock(stats_dir + ".lock"):
             try:
-                statistics = np.load(stats_file).item()
+                statistics = load_trace(stats_dir, ["bw_rx", "bw_tx"])
             except Exception:
-                print("Error loading file %s" % stats_file)
+                print("Error loading trace %s" % stats_dir)
                 exit(1)
-        port_stats = np.moveaxis(statistics["stats"], 0, -1)
-        port_rx_bws = np.array(port_stats[STATS_DICT["bw_rx"]])
-        port_tx_bws = np.array(port_stats[STATS_DICT["bw_tx"]])
+        port_rx_bws = statistics["bw_rx"]
+        port_tx_bws = statistics["bw_tx"]
         # bandwidths
         print("Computing mean of interface bandwidth per step.")
         bw_list["rx"].append(port_rx_bws.mean())
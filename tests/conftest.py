@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+
+# The dc_gym modules import their siblings directly
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "dc_gym"))
+
+INPUT_DIR = os.path.join(ROOT_DIR, "dc_gym", "inputs")
+
+
+@pytest.fixture
+def sim_conf(tmp_path):
+    """ Return a function that builds the conf of a sim env on a dumbbell
+        that writes to tmp_path. Keyword arguments override the defaults. """
+    def make_conf(**overrides):
+        conf = {"env": "sim", "topo": "dumbbell", "transport": "udp",
+                "agent": "PPO", "tf_index": 1, "input_dir": INPUT_DIR,
+                "output_dir": str(tmp_path),
+                "state_model": ["backlog", "bw_rx"],
+                "reward_model": ["backlog", "action", "bw"]}
+        conf.update(overrides)
+        return conf
+    return make_conf
@@ -0,0 +1,77 @@
+import numpy as np
+
+import env_sim
+from dc_gym.iroko_sim import SimFlowCollector
+from dc_gym.monitor.iroko_monitor import encode_sparse_flows
+
+
+def decode(codes):
+    return sorted(code - 1 for code in codes if code)
+
+
+def check_codes(codes, dense, priority=None):
+    """ Every port and direction lists its active hosts, or the ones with
+        the highest priority if they do not fit, in ascending order. """
+    num_slots = codes.shape[-1]
+    for port in range(dense.shape[0]):
+        for direction in range(2):
+            active = np.flatnonzero(dense[port, direction])
+            hosts = decode(codes[port, direction])
+            num_codes = np.count_nonzero(codes[port, direction])
+            # Sorted hosts first, empty slots last
+            assert list(codes[port, direction, :num_codes]) == \
+                [host + 1 for host in hosts]
+            assert not codes[port, direction, num_codes:].any()
+            if len(active) <= num_slots:
+                assert hosts == list(active)
+                continue
+            assert len(hosts) == num_slots
+            assert set(hosts) <= set(active)
+            if priority is not None:
+                kept = priority[port, direction, hosts]
+                dropped = np.delete(priority[port, direction], hosts)
+                assert kept.min() >= dropped.max()
+
+
+def test_encode_matches_dense():
+    rng = np.random.RandomState(0)
+    dense = rng.rand(6, 2, 10) < 0.3
+    priority = np.where(dense, rng.rand(6, 2, 10), -np.inf)
+    for num_slots in (10, 12):
+        codes = np.full((6, 2, num_slots), 99, dtype=np.int64)
+        encode_sparse_flows(priority, codes)
+        check_codes(codes, dense)
+
+
+def test_encode_keeps_highest_priority():
+    rng = np.random.RandomState(1)
+    dense = rng.rand(6, 2, 10) < 0.7
+    dense[0, 0] = True
+    dense[1, 1] = False
+    priority = np.where(dense, rng.rand(6, 2, 10), -np.inf)
+    codes = np.zeros((6, 2, 3), dtype=np.int64)
+    encode_sparse_flows(priority, codes)
+    assert np.count_nonzero(codes[0, 0]) == 3
+    assert not codes[1, 1].any()
+    check_codes(codes, dense, priority)
+
+
+def test_sim_collector_matches_dense(sim_conf):
+    # Eight incast flows share the link between the two switches
+    conf = sim_conf(tf_index=3, topo_conf={"num_hosts": 16})
+    env = env_sim.DCEnv(conf)
+    env.reset()
+    for _ in range(5):
+        env.step(np.full(env.action_space.shape, 0.5))
+    sw_ports = env.topo.get_sw_ports()
+    num_hosts = env.topo.get_num_hosts()
+    dense = SimFlowCollector(env.network, sw_ports,
+                             np.zeros((len(sw_ports), 2, num_hosts)))
+    sparse = SimFlowCollector(env.network, sw_ports,
+                              np.zeros((len(sw_ports), 2, 4)), sparse=True)
+    dense._collect()
+    sparse._collect()
+    env.kill_env()
+    flows = dense.sample
+    assert flows.sum(axis=-1).max() > 4
+    check_codes(sparse.sample.astype(np.int64), flows)
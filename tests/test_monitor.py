@@ -0,0 +1,57 @@
+import multiprocessing
+import time
+import numpy as np
+import pytest
+
+from dc_gym.monitor.iroko_monitor import Collector, CollectorEngine
+
+
+def test_read_published_sample():
+    collector = Collector([], np.zeros((2, 3)))
+    collector.sample[:] = 7
+    collector.taken = 1.5
+    collector._publish()
+    dst = np.zeros((2, 3))
+    assert collector.read(dst) == 1.5
+    np.testing.assert_array_equal(dst, 7)
+
+
+def test_read_gives_up_on_dead_writer():
+    collector = Collector([], np.zeros((2, 3)))
+    collector.READ_TIMEOUT = 0.05
+    # The writer died in the middle of a publish
+    collector.seq.value += 1
+    with pytest.raises(RuntimeError):
+        collector.read(np.zeros((2, 3)))
+
+
+class StuckCollector(Collector):
+
+    INTERVAL = 0.01
+
+    def __init__(self, shared, started):
+        Collector.__init__(self, [], shared)
+        self.started = started
+
+    def _collect(self):
+        self.started.set()
+        # A collector that blocks, e.g., on a hanging subprocess
+        time.sleep(60)
+
+
+def test_terminate_stops_stuck_engine():
+    started = multiprocessing.Event()
+    engine = CollectorEngine([StuckCollector(np.zeros((2, 3)), started)])
+    engine.STOP_TIMEOUT = 0.1
+    engine.start()
+    assert started.wait(10)
+    begin = time.time()
+    engine.terminate()
+    assert not engine.is_alive()
+    assert time.time() - begin < 10
+
+
+def test_terminate_unstarted_engine():
+    engine = CollectorEngine([])
+    engine.terminate()
+    assert engine.kill.is_set()
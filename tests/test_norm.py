@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from iroko_norm import ObsNormalizer
+
+
+def make_stream(num_steps, shape=(3, 4)):
+    rng = np.random.RandomState(0)
+    scale = rng.uniform(1, 1e6, shape)
+    return rng.normal(5.0, 1.0, (num_steps,) + shape) * scale
+
+
+def test_matches_numpy():
+    stream = make_stream(500)
+    norm = ObsNormalizer(stream.shape[1:], clip=np.inf)
+    for obs in stream:
+        out = norm.normalize(obs)
+    assert norm.count == len(stream)
+    np.testing.assert_allclose(norm.mean, np.mean(stream, axis=0))
+    np.testing.assert_allclose(norm.m2 / norm.count, np.var(stream, axis=0))
+    expected = (stream[-1] - stream.mean(axis=0)) / \
+        np.sqrt(stream.var(axis=0) + norm.epsilon)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, expected, rtol=1e-5)
+
+
+def test_clip():
+    norm = ObsNormalizer((2,), clip=2.0)
+    for obs in make_stream(100, (2,)):
+        norm.normalize(obs)
+    out = norm.normalize(norm.mean + 100 * norm.get_std())
+    np.testing.assert_array_equal(out, [2.0, 2.0])
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / "obs_norm.npz")
+    stream = make_stream(50)
+    norm = ObsNormalizer(stream.shape[1:])
+    for obs in stream:
+        norm.normalize(obs)
+    norm.save(path)
+    restored = ObsNormalizer(stream.shape[1:])
+    restored.load(path)
+    assert restored.count == norm.count
+    np.testing.assert_array_equal(restored.mean, norm.mean)
+    np.testing.assert_array_equal(restored.m2, norm.m2)
+    # Both continue on the same statistics
+    np.testing.assert_array_equal(restored.normalize(stream[0]),
+                                  norm.normalize(stream[0]))
+
+
+def test_shape_mismatch(tmp_path):
+    path = str(tmp_path / "obs_norm.npz")
+    norm = ObsNormalizer((3, 4))
+    norm.normalize(np.ones((3, 4)))
+    norm.save(path)
+    with pytest.raises(ValueError):
+        ObsNormalizer((4, 3)).load(path)
+
+
+def test_frozen_stats():
+    stream = make_stream(50)
+    norm = ObsNormalizer(stream.shape[1:])
+    for obs in stream[:25]:
+        norm.normalize(obs)
+    state = norm.get_state()
+    norm.update = False
+    outputs = [norm.normalize(obs).copy() for obs in stream[25:]]
+    assert norm.count == state["count"]
+    np.testing.assert_array_equal(norm.mean, state["mean"])
+    np.testing.assert_array_equal(norm.m2, state["m2"])
+    # The same observation maps to the same output every time
+    std = np.sqrt(state["m2"] / state["count"] + norm.epsilon)
+    for obs, out in zip(stream[25:], outputs):
+        expected = np.clip((obs - state["mean"]) / std, -norm.clip, norm.clip)
+        np.testing.assert_allclose(out, expected, rtol=1e-5)
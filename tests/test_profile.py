@@ -0,0 +1,47 @@
+import numpy as np
+
+from iroko_profile import StepProfiler
+
+# Ratio between the edges of two neighboring bins
+BIN_WIDTH = 10**(1.0 / StepProfiler.BINS_PER_DECADE)
+
+
+def test_percentiles():
+    profiler = StepProfiler(["wait", "read"])
+    durations = np.arange(1, 1001) * 1e-4
+    np.random.RandomState(0).shuffle(durations)
+    for seconds in durations:
+        profiler.record("wait", seconds)
+    profiler.record("read", 5e-7)
+    summary = profiler.summary()
+    stats = summary["wait"]
+    assert stats["count"] == 1000
+    assert np.isclose(stats["mean"], np.mean(durations))
+    assert stats["max"] == 0.1
+    for percentile in StepProfiler.PERCENTILES:
+        expected = np.percentile(durations, percentile)
+        # The upper edge of the bin that holds the percentile
+        value = stats["p%d" % percentile]
+        assert expected * (1 - 1e-9) <= value <= expected * BIN_WIDTH
+    # Durations below the range fall into the first bin
+    assert summary["read"]["p50"] == 5e-7
+
+
+def test_last_step_only():
+    profiler = StepProfiler(["actuate", "trace"])
+    profiler.tic(new_step=True)
+    profiler.record("actuate", 0.1)
+    profiler.record("trace", 0.2)
+    assert profiler.get_last() == {"actuate": 0.1, "trace": 0.2}
+    # A step that is not sampled does not write the trace
+    profiler.tic(new_step=True)
+    profiler.record("actuate", 0.3)
+    profiler.tic()
+    assert profiler.get_last() == {"actuate": 0.3, "trace": 0.0}
+
+
+def test_disabled():
+    profiler = StepProfiler(["wait"], enabled=False)
+    profiler.tic(new_step=True)
+    profiler.toc("wait")
+    assert profiler.summary() == {}
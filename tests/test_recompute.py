@@ -0,0 +1,50 @@
+import numpy as np
+
+import env_sim
+from iroko_trace import TraceWriter, load_trace
+from recompute_rewards import recompute_rewards, get_model_name
+
+STATS_DICT = {"backlog": 0, "olimit": 1, "drops": 2, "bw_rx": 3, "bw_tx": 4}
+REWARD_MODEL = ["backlog", "action", "bw", "olimit", "drops"]
+
+
+def test_recorded_sim_trace(tmp_path, sim_conf):
+    # Enough incast flows to congest the dumbbell from the first step on
+    conf = sim_conf(tf_index=3, topo_conf={"num_hosts": 16},
+                    reward_model=REWARD_MODEL)
+    env = env_sim.DCEnv(conf)
+    env.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(30):
+        env.step(rng.uniform(0.2, 1.0, env.action_space.shape))
+    env.kill_env()
+    trace_dir = str(tmp_path / "runtime_statistics")
+    recorded = load_trace(trace_dir)
+    assert recorded["drops"].any()
+    # A chunk size that does not divide the trace
+    out_dir = recompute_rewards(trace_dir, chunk=7)
+    results = load_trace(out_dir)
+    name = get_model_name(REWARD_MODEL)
+    assert np.abs(results[name] - recorded["reward"]).max() == 0
+    assert np.abs(results[name + "_parts"] -
+                  recorded["reward_parts"]).max() == 0
+
+
+def test_first_step_counts_from_zero(tmp_path):
+    trace_dir = str(tmp_path / "runtime_statistics")
+    columns = [("reward", np.float64, ()), ("actions", np.float64, (1,))]
+    for stat in sorted(STATS_DICT, key=STATS_DICT.get):
+        columns.append((stat, np.int64, (2,)))
+    meta = {"stats_dict": STATS_DICT, "sw_ports": ["s1-eth1", "s1-eth2"],
+            "host_ports": ["s1-eth2"], "max_queue": 100, "max_capacity": 10,
+            "reward_model": ["bw", "drops"]}
+    writer = TraceWriter(trace_dir, columns, meta=meta)
+    # Drops before the first step, none after it
+    stats = np.zeros((len(STATS_DICT), 2), dtype=np.int64)
+    stats[STATS_DICT["drops"]] = [0, 5]
+    stats[STATS_DICT["bw_rx"]] = [0, 10]
+    writer.append(0.25, [1.0], *stats)
+    writer.append(1.0, [1.0], *stats)
+    writer.close()
+    rewards = load_trace(recompute_rewards(trace_dir))["bw-drops"]
+    np.testing.assert_array_equal(rewards, [0.25, 1.0])
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import env_replay
+import env_sim
+from iroko_trace import load_trace
+
+
+def record_trace(sim_conf, num_steps):
+    env = env_sim.DCEnv(sim_conf(tf_index=3, topo_conf={"num_hosts": 16}))
+    env.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(num_steps):
+        env.step(rng.uniform(0.2, 1.0, env.action_space.shape))
+    env.kill_env()
+    return "%s/runtime_statistics" % env.conf["output_dir"]
+
+
+def replay_conf(sim_conf, trace_dir, **overrides):
+    conf = sim_conf(env="replay", replay_trace=trace_dir)
+    conf.update(overrides)
+    return conf
+
+
+def test_window_longer_than_trace(sim_conf):
+    trace_dir = record_trace(sim_conf, 20)
+    with pytest.raises(SystemExit):
+        env_replay.DCEnv(replay_conf(sim_conf, trace_dir, replay_window=25))
+
+
+def test_replay_reproduces_rewards(sim_conf):
+    trace_dir = record_trace(sim_conf, 20)
+    recorded = load_trace(trace_dir)
+    env = env_replay.DCEnv(replay_conf(sim_conf, trace_dir))
+    assert env.window == 19
+    env.reset()
+    # The first recorded step is the baseline of the deltas
+    for step in range(1, 20):
+        action = recorded["actions"][step] / env.max_capacity
+        obs, reward, done, info = env.step(action)
+        assert info["trace_step"] == step
+        assert reward == recorded["reward"][step]
+        assert done == (step == 19)
+    env.kill_env()
+
+
+def test_windows_continue_and_wrap(sim_conf):
+    trace_dir = record_trace(sim_conf, 20)
+    env = env_replay.DCEnv(replay_conf(sim_conf, trace_dir, replay_window=4,
+                                       replay_stride=2))
+    action = np.full(env.action_space.shape, 0.5)
+    starts = []
+    for _ in range(4):
+        env.reset()
+        starts.append(env.replay.index)
+        done = False
+        while not done:
+            obs, reward, done, info = env.step(action)
+        assert info["trace_step"] == starts[-1] + 8
+    env.kill_env()
+    # Windows of 8 recorded steps, the third one would run past step 19
+    assert starts == [0, 8, 0, 8]
+
+
+def test_spaces_match_the_recorded_env(sim_conf):
+    trace_dir = record_trace(sim_conf, 5)
+    overrides = {"obs_history": 3, "obs_norm": True,
+                 "state_model": ["backlog", "d_drops", "bw_rx"]}
+    sim_env = env_sim.DCEnv(sim_conf(tf_index=3, topo_conf={"num_hosts": 16},
+                                     **overrides))
+    env = env_replay.DCEnv(replay_conf(sim_conf, trace_dir, **overrides))
+    assert env.observation_space == sim_env.observation_space
+    assert env.action_space == sim_env.action_space
+    env.reset()
+    obs, reward, done, info = env.step(np.full(env.action_space.shape, 0.5))
+    assert obs.shape == env.observation_space.shape
+    assert obs.dtype == np.float32
+    sim_env.kill_env()
+    env.kill_env()
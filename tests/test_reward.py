@@ -0,0 +1,103 @@
+import numpy as np
+
+from iroko_reward import RewardFunction
+
+STATS_DICT = {"backlog": 0, "olimit": 1, "drops": 2, "bw_rx": 3, "bw_tx": 4}
+SW_PORTS = ["s1-eth1", "s1-eth2", "s1-eth3", "s2-eth1", "s2-eth2", "s2-eth3"]
+HOST_PORTS = ["s1-eth2", "s1-eth3", "s2-eth2", "s2-eth3"]
+MAX_QUEUE = 1000.0
+MAX_BW = 100.0
+MODEL = ["backlog", "action", "bw", "std_dev", "olimit", "drops"]
+
+
+def baseline_reward(stats, deltas, actions, reward_model):
+    """ The reward of one step computed port by port. """
+    parts = {}
+    if "action" in reward_model:
+        parts["action"] = np.average([bw / MAX_BW for bw in actions])
+    if "bw" in reward_model:
+        bw_reward = 0.0
+        for index, iface in enumerate(SW_PORTS):
+            if iface in HOST_PORTS:
+                bw_reward += stats[STATS_DICT["bw_rx"]][index] / MAX_BW
+        for stat in ("olimit", "drops"):
+            if stat in reward_model and any(deltas[STATS_DICT[stat]]):
+                bw_reward /= 4
+        parts["bw"] = bw_reward
+    if "backlog" in reward_model:
+        queue_reward = 0.0
+        for index, _ in enumerate(SW_PORTS):
+            queue = stats[STATS_DICT["backlog"]][index]
+            queue_reward -= (float(queue) / MAX_QUEUE)**2
+        weight = len(SW_PORTS) / float(len(HOST_PORTS))
+        parts["backlog"] = queue_reward * weight * 5
+    if "std_dev" in reward_model:
+        parts["std_dev"] = -(np.std(actions) / MAX_BW)
+    return sum(parts.values()), parts
+
+
+def make_steps(num_steps):
+    rng = np.random.RandomState(0)
+    stats = rng.randint(0, 1000, (num_steps, len(STATS_DICT),
+                                  len(SW_PORTS))).astype(float)
+    deltas = np.zeros_like(stats)
+    # Overlimits and drops on some of the steps
+    deltas[1, STATS_DICT["olimit"], 4] = 3
+    deltas[2, STATS_DICT["drops"], 0] = 1
+    deltas[3, STATS_DICT["olimit"], 1] = 2
+    deltas[3, STATS_DICT["drops"], 5] = 2
+    actions = rng.uniform(0, MAX_BW, (num_steps, len(HOST_PORTS)))
+    return stats, deltas, actions
+
+
+def make_reward(reward_model):
+    return RewardFunction(HOST_PORTS, SW_PORTS, reward_model, MAX_QUEUE,
+                          MAX_BW, STATS_DICT)
+
+
+def test_fixed_step():
+    stats = np.zeros((len(STATS_DICT), len(SW_PORTS)))
+    stats[STATS_DICT["backlog"]] = [0, 500, 0, 1000, 0, 0]
+    stats[STATS_DICT["bw_rx"]] = [80, 10, 20, 90, 30, 40]
+    deltas = np.zeros_like(stats)
+    deltas[STATS_DICT["drops"], 3] = 1
+    actions = np.array([10.0, 20.0, 30.0, 40.0])
+    reward_func = make_reward(MODEL)
+    reward = reward_func.get_reward(stats, deltas, actions)
+    parts = reward_func.get_components()
+    assert np.isclose(parts["action"], 0.25)
+    # Only host ports count, the drop quarters the reward
+    assert np.isclose(parts["bw"], 1.0 / 4)
+    assert np.isclose(parts["backlog"], -(0.25 + 1.0) * 1.5 * 5)
+    assert np.isclose(parts["std_dev"], -np.sqrt(125.0) / MAX_BW)
+    assert np.isclose(reward, sum(parts.values()))
+
+
+def test_matches_baseline():
+    stats, deltas, actions = make_steps(8)
+    for reward_model in (MODEL, ["backlog", "action", "bw"], ["bw", "drops"],
+                         ["std_dev"]):
+        reward_func = make_reward(reward_model)
+        for step in range(len(stats)):
+            reward = reward_func.get_reward(stats[step], deltas[step],
+                                            actions[step])
+            expected, parts = baseline_reward(stats[step], deltas[step],
+                                              actions[step], reward_model)
+            assert np.isclose(reward, expected)
+            components = reward_func.get_components()
+            assert sorted(components) == sorted(parts)
+            for name, value in parts.items():
+                assert np.isclose(components[name], value)
+
+
+def test_batch_matches_single_steps():
+    stats, deltas, actions = make_steps(8)
+    reward_func = make_reward(MODEL)
+    rewards, values = reward_func.get_rewards(stats, deltas, actions)
+    assert rewards.shape == (8,)
+    assert values.shape == (8, len(reward_func.components))
+    for step in range(len(stats)):
+        reward = reward_func.get_reward(stats[step], deltas[step],
+                                        actions[step])
+        assert np.isclose(rewards[step], reward)
+        np.testing.assert_allclose(values[step], reward_func.values)
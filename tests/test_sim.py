@@ -0,0 +1,155 @@
+import time
+import types
+import numpy as np
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+import env_iroko
+import env_sim
+from dc_gym.iroko_sim import SimTopoConfig, FluidNetwork
+
+def test_conf_does_not_leak(sim_conf):
+    iroko_defaults = dict(env_iroko.DEFAULT_CONF)
+    sim_defaults = dict(env_sim.DEFAULT_CONF)
+    env = env_sim.DCEnv(sim_conf(sim_tick=0.01))
+    env.kill_env()
+    assert env.conf["sim_tick"] == 0.01
+    assert env_sim.DEFAULT_CONF == sim_defaults
+    assert env_iroko.DEFAULT_CONF == iroko_defaults
+    assert "sim_tick" not in env_iroko.DEFAULT_CONF
+
+
+def test_dumbbell_layout():
+    topo = SimTopoConfig("dumbbell", {"num_hosts": 4})
+    # Odd hosts sit on the west switch, even hosts on the east switch
+    assert list(topo.host_ips.items()) == [
+        ("h1", "10.1.0.1"), ("h3", "10.1.0.2"),
+        ("h2", "10.2.0.2"), ("h4", "10.2.0.3")]
+    assert list(topo.host_ctrl_map.items()) == [
+        ("s1-eth2", "c0-eth0"), ("s1-eth3", "c0-eth1"),
+        ("s2-eth2", "c0-eth2"), ("s2-eth3", "c0-eth3")]
+    assert topo.get_sw_ports() == ["s1-eth1", "s1-eth2", "s1-eth3",
+                                   "s2-eth1", "s2-eth2", "s2-eth3"]
+
+
+def test_fattree_layout():
+    topo = SimTopoConfig("fattree", {"fanout": 4, "density": 2})
+    assert topo.get_num_hosts() == 16
+    # 4 core, 8 aggregation, and 8 edge switches with 4 ports each
+    assert topo.get_num_sw_ports() == 80
+    assert topo.host_ips["h3"] == "10.2.0.1"
+    assert topo.topo.ports["s31"][3] == ("h1", 0)
+
+
+def test_fresh_mode_advances_time(sim_conf):
+    env = env_sim.DCEnv(sim_conf(step_mode="fresh"))
+    env.reset()
+    action = np.full(env.action_space.shape, 1.0)
+    rewards = []
+    for _ in range(20):
+        before = env.network.now
+        obs, reward, done, info = env.step(action)
+        assert env.network.now > before
+        assert not info["deadline_missed"]
+        rewards.append(info["reward_parts"]["bw"])
+    env.kill_env()
+    # Traffic flows once simulated time moves
+    assert max(rewards) > 0
+
+
+class PeriodicSamples(object):
+    """ Collectors that sample on a fixed wall-clock period. """
+
+    def __init__(self, period):
+        self.period = period
+        self.start = monotonic()
+        self.since = []
+
+    def wait_for_samples(self, since, timeout):
+        self.since.append(since)
+        # Sleep until the first sample after since
+        ticks = (since - self.start) // self.period + 1
+        time.sleep(max(self.start + ticks * self.period -
+                       monotonic(), 0))
+        return True
+
+
+def test_fresh_mode_counts_from_the_action(sim_conf, monkeypatch):
+    env = env_sim.DCEnv(sim_conf(step_mode="fresh"))
+    env.reset()
+    # Wait like the emulated environment, on wall-clock samples
+    env._wait_for_obs = types.MethodType(env_iroko.DCEnv._wait_for_obs, env)
+    samples = PeriodicSamples(0.2)
+    monkeypatch.setattr(type(env.state_man), "_now",
+                        lambda state_man: monotonic())
+    monkeypatch.setattr(type(env.state_man), "wait_for_samples",
+                        lambda state_man, since, timeout:
+                        samples.wait_for_samples(since, timeout))
+    env.step_async(np.full(env.action_space.shape, 0.5))
+    # The agent works for longer than one sample period
+    time.sleep(0.25)
+    waited = monotonic()
+    env.step_wait()
+    waited = monotonic() - waited
+    env.kill_env()
+    assert samples.since == [env.applied]
+    # The sample taken during the sleep is fresh, no need to wait for another
+    assert waited < 0.1
+
+
+def test_step_info_uses_simulated_time(sim_conf):
+    env = env_sim.DCEnv(sim_conf())
+    env.reset()
+    action = np.full(env.action_space.shape, 0.5)
+    env.step(action)
+    for _ in range(5):
+        # The agent computing between steps does not advance the network
+        time.sleep(0.01)
+        obs, reward, done, info = env.step(action)
+        assert np.isclose(info["ctrl_period"], env.WAIT)
+        assert info["act_delay"] == 0.0
+        assert 0.0 <= info["obs_age"] <= env.WAIT + 1e-9
+    env.kill_env()
+
+
+def run_network(transport, fast_forward):
+    topo = SimTopoConfig("dumbbell", {"num_hosts": 8})
+    network = FluidNetwork(topo)
+    network.transport = transport
+    if not fast_forward:
+        network._get_idle_ticks = lambda ticks: 0
+    steps = []
+    step = network._step
+
+    def count_step():
+        steps.append(network.now)
+        step()
+    network._step = count_step
+    # Flows from the west to the east hosts that start and stop
+    network.set_flows([(0, 1, 0.0, 2.0), (2, 1, 0.0, 1.0),
+                       (4, 3, 0.5, 2.0), (6, 5, 0.0, 0.33)])
+    rates = np.full(len(network.host_rates), network.capacity / 2)
+    mask = np.ones(len(rates), dtype=bool)
+    # Overload the port of host 1 for a while, then let it drain
+    for share, duration in ((1.0, 0.1), (0.25, 0.4), (0.125, 0.5),
+                            (0.0625, 1.0)):
+        rates[0] = network.capacity * share
+        network.set_host_rates(rates, mask)
+        network.advance(duration)
+    return network, len(steps)
+
+
+def test_fast_forward_matches_ticks():
+    for transport in ("udp", "tcp"):
+        fast, fast_steps = run_network(transport, True)
+        slow, slow_steps = run_network(transport, False)
+        assert fast.now == slow.now == 2.0
+        assert slow_steps == 400
+        np.testing.assert_allclose(fast.counters, slow.counters, rtol=1e-9)
+        np.testing.assert_allclose(fast.backlog, slow.backlog, rtol=1e-9)
+        assert fast.counters.any()
+        if transport == "udp":
+            # Most ticks repeat the previous one
+            assert fast_steps < slow_steps / 4
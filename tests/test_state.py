@@ -0,0 +1,28 @@
+import numpy as np
+
+import env_sim
+
+
+def test_history_keeps_last_frames(sim_conf):
+    history_len = 3
+    env = env_sim.DCEnv(sim_conf(obs_history=history_len))
+    env.reset()
+    state_man = env.state_man
+    assert env.observation_space.shape == (history_len * state_man.obs.size,)
+    frames = []
+    # Wrap around the ring of 2 * history_len frames more than once
+    for i in range(1, 5 * history_len + 2):
+        state_man.obs.fill(i)
+        frames.append(state_man.obs.copy())
+        view = state_man._push_history()
+        expected = frames[-history_len:]
+        # Zero frames pad the history until it is filled
+        padding = [np.zeros_like(frames[0])] * (history_len - len(expected))
+        assert np.array_equal(view, np.stack(padding + expected))
+    state_man.reset()
+    assert not state_man.history.any()
+    state_man.obs.fill(42)
+    view = state_man._push_history()
+    assert not view[:-1].any()
+    assert (view[-1] == 42).all()
+    env.kill_env()
@@ -0,0 +1,102 @@
+import numpy as np
+
+from iroko_trace import TraceWriter, load_trace, load_header
+from iroko_trace import convert_legacy_stats, LEGACY_STATS_DICT
+
+COLUMNS = [("reward", np.float64, ()),
+           ("actions", np.float64, (3,)),
+           ("backlog", np.int64, (4,))]
+
+
+def make_steps(num_steps):
+    reward = np.arange(num_steps, dtype=np.float64) * 0.5
+    actions = np.arange(num_steps * 3, dtype=np.float64).reshape(-1, 3)
+    backlog = np.arange(num_steps * 4, dtype=np.int64).reshape(-1, 4)
+    return reward, actions, backlog
+
+
+def check_rows(trace, steps, num_rows):
+    for (name, _, _), values in zip(COLUMNS, steps):
+        assert len(trace[name]) == num_rows
+        np.testing.assert_array_equal(trace[name], values[:num_rows])
+
+
+def test_append_across_chunks(tmp_path):
+    out_dir = str(tmp_path / "trace")
+    steps = make_steps(11)
+    writer = TraceWriter(out_dir, COLUMNS, chunk_size=4, meta={"run": 1})
+    for step in range(11):
+        writer.append(*[values[step] for values in steps])
+    # Two full chunks are on disk, the third is still buffered
+    check_rows(load_trace(out_dir), steps, 8)
+    assert not load_header(out_dir)["complete"]
+    writer.close()
+    check_rows(load_trace(out_dir), steps, 11)
+    header = load_header(out_dir)
+    assert header["complete"]
+    assert header["meta"] == {"run": 1}
+    assert header["columns"]["actions"]["shape"] == [3]
+
+
+def test_extend_across_chunks(tmp_path):
+    out_dir = str(tmp_path / "trace")
+    steps = make_steps(23)
+    writer = TraceWriter(out_dir, COLUMNS, chunk_size=5)
+    writer.append(*[values[0] for values in steps])
+    writer.extend(*[values[1:13] for values in steps])
+    writer.extend(*[values[13:] for values in steps])
+    check_rows(load_trace(out_dir), steps, 20)
+    writer.flush()
+    check_rows(load_trace(out_dir), steps, 23)
+    assert not load_header(out_dir)["complete"]
+    writer.close()
+    check_rows(load_trace(out_dir), steps, 23)
+    assert load_header(out_dir)["complete"]
+    assert load_header(out_dir)["meta"] == {}
+
+
+def test_load_selected_columns(tmp_path):
+    out_dir = str(tmp_path / "trace")
+    steps = make_steps(3)
+    writer = TraceWriter(out_dir, COLUMNS, chunk_size=2)
+    writer.extend(*steps)
+    writer.close()
+    trace = load_trace(out_dir, ["backlog"])
+    assert list(trace.keys()) == ["backlog"]
+    np.testing.assert_array_equal(trace["backlog"], steps[2])
+
+
+def test_meta_default_is_not_shared(tmp_path):
+    first = TraceWriter(str(tmp_path / "first"), COLUMNS)
+    first.header["meta"]["run"] = 1
+    second = TraceWriter(str(tmp_path / "second"), COLUMNS)
+    assert second.header["meta"] == {}
+    first.close()
+    second.close()
+
+
+def test_convert_legacy_stats(tmp_path):
+    stats_file = str(tmp_path / "runtime_statistics.npy")
+    rng = np.random.RandomState(0)
+    items = []
+    # Legacy files hold several pickled dicts, one per flush
+    for _ in range(2):
+        items.append({"stats": [rng.randint(0, 9, (5, 6)) for _ in range(4)],
+                      "reward": list(rng.rand(4)),
+                      "actions": [rng.rand(3) for _ in range(4)]})
+    with open(stats_file, "wb") as npy_file:
+        for item in items:
+            np.save(npy_file, np.array(item))
+    trace_dir = convert_legacy_stats(stats_file, chunk_size=3)
+    assert trace_dir == str(tmp_path / "runtime_statistics")
+    header = load_header(trace_dir)
+    assert header["complete"]
+    assert header["meta"]["stats_dict"] == LEGACY_STATS_DICT
+    trace = load_trace(trace_dir)
+    stats = np.array([s for item in items for s in item["stats"]])
+    rewards = [r for item in items for r in item["reward"]]
+    actions = [a for item in items for a in item["actions"]]
+    np.testing.assert_array_equal(trace["reward"], rewards)
+    np.testing.assert_array_equal(trace["actions"], actions)
+    for name, row in LEGACY_STATS_DICT.items():
+        np.testing.assert_array_equal(trace[name], stats[:, row])
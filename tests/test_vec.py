@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import numpy as np
+
+import env_sim
+import dc_gym.iroko_vec as iroko_vec
+from dc_gym.iroko_vec import VecEnv
+
+
+def _wait_for(event):
+    event.wait()
+
+
+class ChildProcessEnv(env_sim.DCEnv):
+    """ Starts a child process like the CollectorEngine of the iroko env,
+        which Mininet is not needed for. """
+
+    def __init__(self, conf):
+        self.stop = multiprocessing.Event()
+        self.child = multiprocessing.Process(target=_wait_for,
+                                             args=(self.stop,))
+        self.child.start()
+        env_sim.DCEnv.__init__(self, conf)
+
+    def kill_env(self):
+        env_sim.DCEnv.kill_env(self)
+        if self.child.is_alive():
+            self.stop.set()
+            self.child.join()
+
+
+class ChildProcessFactory(object):
+    @staticmethod
+    def create(config):
+        return ChildProcessEnv(config)
+
+
+def test_workers_may_start_processes(tmp_path, sim_conf, monkeypatch):
+    monkeypatch.setattr(iroko_vec, "EnvFactory", ChildProcessFactory)
+    vec_env = VecEnv(sim_conf(), 2)
+    obs = vec_env.reset()
+    assert obs.shape == (2,) + vec_env.observation_space.shape
+    actions = np.full((2,) + vec_env.action_space.shape, 0.5)
+    for _ in range(5):
+        obs, rewards, dones, infos = vec_env.step(actions)
+    assert len(infos) == 2
+    vec_env.close()
+    for proc in vec_env.procs:
+        assert not proc.is_alive()
+        assert proc.exitcode == 0
+    # Closing twice is harmless
+    vec_env.close()
+    for index in range(2):
+        assert os.path.isdir(str(tmp_path / ("env%d" % index)))